@@ -0,0 +1,102 @@
+from difflib import SequenceMatcher
+import numpy as np
+import pandas as pd
+
+# USPS Publication 28 abbreviations for the street suffixes, directionals and unit designators seen in the CRM exports
+street_suffixes = {
+    'STREET': 'ST', 'STR': 'ST', 'AVENUE': 'AVE', 'AV': 'AVE', 'BOULEVARD': 'BLVD', 'ROAD': 'RD', 'DRIVE': 'DR',
+    'LANE': 'LN', 'COURT': 'CT', 'PLACE': 'PL', 'TERRACE': 'TER', 'CIRCLE': 'CIR', 'PARKWAY': 'PKWY',
+    'HIGHWAY': 'HWY', 'TRAIL': 'TRL', 'SQUARE': 'SQ', 'EXPRESSWAY': 'EXPY', 'CAUSEWAY': 'CSWY', 'POINT': 'PT',
+}
+directionals = {
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW',
+}
+unit_designators = {'APARTMENT': '#', 'APT': '#', 'UNIT': '#', 'SUITE': '#', 'STE': '#'}
+usps_abbreviations = {**street_suffixes, **directionals, **unit_designators}
+
+usps_pattern = r'\b(' + '|'.join(usps_abbreviations) + r')\b'
+suffix_pattern = r'\b(' + '|'.join(sorted(set(street_suffixes.values()) | {'WAY'})) + r')\b'
+number_pattern = r'\b(?:\d\w*|' + '|'.join(directionals.values()) + r')\b'
+
+# Similarity of the street names above which two addresses of the same block are the same address,
+# 1 only merges addresses that are equal once standardized
+DEDUP_SIMILARITY = 1.0
+
+def normalize_address(address):
+    # Upper case and collapse whitespace so the same address typed differently compares equal
+    return address.astype('string').str.upper().str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def normalize_zip(zip_code):
+    # Keep the 5-digit zip, dropping any ZIP+4 suffix
+    return zip_code.astype('string').str.extract(r'(\d{5})', expand=False)
+
+def mailing_address_keys(address, zip_code):
+    # Readable "ADDRESS|ZIP" key, missing when there is no address
+    address = normalize_address(address)
+    keys = address + '|' + normalize_zip(zip_code).fillna('')
+    return keys.where(address.notna() & (address != ''))
+
+def owner_address_keys(first_name, last_name, address, zip_code):
+    # Hash the normalized owner name + mailing address + zip into a single uint64 key per row
+    fields = pd.DataFrame({
+        'first_name': normalize_address(first_name),
+        'last_name': normalize_address(last_name),
+        'address': normalize_address(address),
+        'zip': normalize_zip(zip_code),
+    })
+    keys = pd.util.hash_pandas_object(fields, index=False)
+
+    # Rows with neither a name nor an address can't be matched to anything
+    present = (fields[['first_name', 'last_name', 'address']].fillna('') != '').any(axis=1)
+    return keys.to_numpy(), present.to_numpy()
+
+def standardize_address(address):
+    # USPS-style form: "123 North Main Street, Apt. 4" and "123 N MAIN ST # 4" both become "123 N MAIN ST # 4"
+    address = normalize_address(address).str.replace(r'[.,]', '', regex=True).str.replace('#', ' # ', regex=False)
+    address = address.str.replace(usps_pattern, lambda match: usps_abbreviations[match.group(1)], regex=True)
+    return address.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def address_parts(address):
+    # Split standardized addresses into the parts that must agree exactly and the street name compared fuzzily
+    unit = address.str.extract(r'#\s*(.*)$', expand=False).fillna('')
+    street = address.str.replace(r'\s*#.*$', '', regex=True)
+    suffix = street.str.extract(r'.*' + suffix_pattern, expand=False).fillna('')
+
+    # House numbers, numbered streets and directionals, then the suffix ("ST" and "CT" are different streets) and the unit
+    numbers = street.str.findall(number_pattern).str.join(' ')
+    block = numbers + '|' + suffix + '|' + unit
+    name = street.str.replace(number_pattern, '', regex=True).str.replace(suffix_pattern, '', regex=True)
+    return block, name.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def address_clusters(address, zip_code, similarity=DEDUP_SIMILARITY):
+    # Label each row with the cluster of rows sharing its mailing address, -1 when there is no address
+    address = standardize_address(address).fillna('').reset_index(drop=True)
+    zip_code = normalize_zip(zip_code).fillna('').reset_index(drop=True)
+    codes, uniques = pd.factorize(address + '|' + zip_code)
+    parent = np.arange(len(uniques))
+
+    # Compare only the street names of distinct addresses sharing a zip, numbers, suffix and unit, so the blocks stay small
+    if similarity is not None and similarity < 1 and len(uniques):
+        unique_addresses = pd.Series(uniques).str.rsplit('|', n=1).str[0]
+        unique_zips = pd.Series(uniques).str.rsplit('|', n=1).str[1]
+        blocks, names = address_parts(unique_addresses)
+        blocks = unique_zips + '|' + blocks
+        in_block = blocks.duplicated(keep=False).to_numpy() & (unique_addresses != '').to_numpy()
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for members in pd.Series(np.flatnonzero(in_block)).groupby(blocks[in_block].to_numpy()):
+            members = members[1].to_numpy()
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    if find(a) != find(b) and SequenceMatcher(None, names[a], names[b]).ratio() >= similarity:
+                        parent[find(b)] = find(a)
+        parent = np.array([find(i) for i in range(len(parent))])
+
+    clusters = parent[codes]
+    return np.where((address != '').to_numpy(), clusters, -1)
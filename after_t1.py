@@ -1,198 +1,302 @@
-import pandas as pd
 import os
+import numpy as np
+import pandas as pd
+
+from batch_files import pair_batches
+from batch_stats import STATS_FOLDER, append_batch_stats, batch_label, batch_stats
+from clean_store import CLEAN_STORE_FOLDER, is_clean, sync_clean_store
+from instrumentation import measure, run_report_from_env
+from ledger import LEDGER_PATH, record_outcomes
+from phones import phone_columns, normalize_phone_columns
+from schema import apply_schema
+from xlsx_cache import read_excel_cached, read_table_cached
+from xlsx_io import write_excel
+
+# Prepare column rename mapping for Non Hits
+non_hits_column_rename = {
+    "Folio": "Folio",
+    "First Name": "FirstName",
+    "Last Name": "LastName",
+    "Mailing Address": "MailingAddress",
+    "Mailing city": "MailingCity",
+    "Mailing state": "MailingState",
+    "Mailing zip": "MailingZip",
+    "Property Address": "PropertyAddress",
+    "Property city": "PropertyCity",
+    "Property State": "PropertyState",
+    "Property zip": "PropertyZip"
+}
+
+# Columns and values for the 'Import Flagged Litigators' file
+flagged_selected_columns = [
+    'Folio', 'Property Address', 'Property zip', 'Bankrupcy',
+    'Estate', 'Golden Address', 'Golden city', 'Golden State', 'Golden Zip'
+]
+flagged_additional_columns = {
+    'Property Skip Trace': 'BST',
+    'Number Source': 'T1Skiptrace',
+    'Phone number skip trace': 'BST',
+    'TAG': 'T1Skiptrace',
+    'Note': 'Possible Litigator',
+    'Action Plan': '30'
+}
+
+# Define all columns to be included in the 'Import T1 Skiptrace' output
+final_columns = [
+    'Folio', 'Property Address', 'Property zip', 'Bankrupcy', 'Estate', 
+    'Golden Address', 'Golden city', 'Golden State', 'Golden Zip', 
+    'PH: Phone1', 'PH: Phone1 Type', 'PH: Phone2', 'PH: Phone2 Type', 
+    'PH: Phone3', 'PH: Phone3 Type', 'PH: Phone4', 'PH: Phone4 Type', 
+    'PH: Phone5', 'PH: Phone5 Type', 'EMAIL: Email1', 'EMAIL: Email2', 
+    'EMAIL: Email3', 'EMAIL: Email4', 'EMAIL: Email5',
+    'REL1: Phone 1', 'REL1: Phone 2', 'REL1: Phone 3', 
+    'REL2: Phone 1', 'REL2: Phone 2', 'REL2: Phone 3', 
+    'REL3: Phone 1', 'REL3: Phone 2', 'REL3: Phone 3'
+]
+
+# Additional columns to append to the 'Import T1 Skiptrace' output
+import_additional_columns = {
+    'Property Skip Trace': 'BST',
+    'Number Source': 'T1Skiptrace',
+    'Phone number skip trace': 'BST',
+    'TAG': 'T1Skiptrace'
+}
+
+# Reports written by after_t1.py: key in the reports dictionary, file name and description
+report_files = [
+    ('cleaned', "T1Skiptrace BST_out_Cleaned.xlsx", "Cleaned T1Skiptrace file"),
+    ('flagged', "Flagged_Litigators.xlsx", "Flagged Litigators file"),
+    ('non_hits', "Non_Hits.xlsx", "Non Hits file"),
+    ('import_flagged', "Import_Flagged_Litigators.xlsx", "'Import Flagged Litigators' file"),
+    ('testing_flagged', "Testing_Flagged_Litigators.xlsx", "Testing Flagged Litigators file"),
+    ('import_t1_skiptrace', "Import_T1_Skiptrace.xlsx", "'Import T1 Skiptrace' file"),
+]
+
+# The Litigator scrubbing file can also be written as CSV or Parquet by the streaming mode of before_t1.py
+litigator_extensions = ('.xlsx', '.csv', '.parquet')
+
+def find_file(folder, name_part, extensions=('.xlsx',), newest=False):
+    # Return the path of the first file in folder whose name contains name_part, or the most recently modified one
+    file_paths = [os.path.join(folder, f) for f in os.listdir(folder) if name_part in f and f.endswith(extensions)]
+    if not file_paths:
+        return None
+    return max(file_paths, key=os.path.getmtime) if newest else file_paths[0]
+
+def find_missing_numbers(litigator_data, clean_numbers):
+    # Flag the Litigator scrubbing rows whose number is not in the 'all_clean' store
+    return ~is_clean(litigator_data['Numbers'], clean_numbers)
+
+# Category of each T1Skiptrace row, computed once and used to derive every report
+row_categories = ['litigator', 'hit', 'non-hit']
+
+def classify_t1_data(t1_data, litigator_data, clean_numbers):
+    # Identify the numbers not in 'all_clean' and the associated IDs
+    missing_numbers = find_missing_numbers(litigator_data, clean_numbers)
+    missing_ids = litigator_data['ID'].to_numpy()[missing_numbers]
+
+    # A row is a litigator if any of its numbers is missing, a hit if it has any phone, a non-hit otherwise
+    is_litigator = t1_data['ID'].isin(missing_ids).to_numpy()
+    has_phone = t1_data[phone_columns].notna().to_numpy().any(axis=1)
+    codes = np.where(is_litigator, 0, np.where(has_phone, 1, 2)).astype(np.int8)
+
+    return pd.Categorical.from_codes(codes, categories=row_categories), missing_numbers
+
+def non_hits_report(non_hits_data):
+    non_hits_final = non_hits_data[list(non_hits_column_rename.keys())].rename(columns=non_hits_column_rename)
+    
+    # Check and transfer values from FirstName to LastName if LastName is empty
+    non_hits_final.loc[non_hits_final['LastName'].isna(), 'LastName'] = non_hits_final['FirstName']
+    non_hits_final.loc[non_hits_final['LastName'] == non_hits_final['FirstName'], 'FirstName'] = ""
+    return non_hits_final
+
+def import_flagged_report(flagged_litigators_data):
+    # Prepare data for 'Import Flagged Litigators' file
+    import_flagged_litigators_data = flagged_litigators_data[flagged_selected_columns].copy()
+    for col, value in flagged_additional_columns.items():
+        import_flagged_litigators_data[col] = value
+    return apply_schema(import_flagged_litigators_data)
+
+def import_t1_report(hits_data):
+    # Add missing columns with None values and reorder the DataFrame according to the final_columns list
+    import_t1_skiptrace_data = hits_data.reindex(columns=final_columns)
+
+    # Add additional columns with predefined values
+    for column, value in import_additional_columns.items():
+        import_t1_skiptrace_data[column] = value
+    return apply_schema(import_t1_skiptrace_data)
+
+def build_reports(t1_data, litigator_data, clean_numbers):
+    # Classify every row once, then derive all the reports as selections of that category
+    category, missing_numbers = classify_t1_data(t1_data, litigator_data, clean_numbers)
+    codes = category.codes
+    flagged_litigators_data = t1_data[codes == 0]
+
+    return {
+        'category': category,
+        'cleaned': t1_data[codes != 0],
+        'flagged': flagged_litigators_data,
+        'non_hits': non_hits_report(t1_data[codes == 2]),
+        'import_flagged': import_flagged_report(flagged_litigators_data),
+        'testing_flagged': litigator_data.loc[missing_numbers, ['ID', 'Numbers']],
+        'import_t1_skiptrace': import_t1_report(t1_data[codes == 1]),
+        'stats': batch_stats(t1_data, category),
+    }
+
+def record_report_outcomes(t1_data, category, ledger_path=LEDGER_PATH):
+    # Store the hit, non-hit and litigator outcomes in the ledger read by skiptrace.py
+    for outcome in row_categories:
+        record_outcomes(t1_data['Folio'][category == outcome], outcome, ledger_path)
+
+def build_import_t1_skiptrace(t1_data_cleaned, litigator_data, clean_numbers):
+    # Standalone version working from a saved 'T1Skiptrace BST_out_Cleaned' file
+    missing_numbers = find_missing_numbers(litigator_data, clean_numbers)
+    testing_flagged_litigators_data = litigator_data.loc[missing_numbers, ['ID', 'Numbers']]
+
+    # Filter rows to include only those with any non-empty phone information
+    has_phone = t1_data_cleaned.reindex(columns=phone_columns).notna().to_numpy().any(axis=1)
+    return testing_flagged_litigators_data, import_t1_report(t1_data_cleaned[has_phone])
 
-def identify_litigators_and_create_reports(input_folder="t1 input", output_folder="t1 output", result_folder="after t1 output"):
+def campaign_file_name(input_folder, t1_file_path):
+    # The campaign file the modified T1Skiptrace file was made from, when the pair is still in the input folder
+    t1_file_name = batch_label(os.path.basename(t1_file_path))
+    try:
+        pairs = pair_batches(input_folder, report_unpaired=False)
+    except OSError:
+        return None
+    return next((campaign for t1_file, campaign in pairs if t1_file == t1_file_name), None)
+
+def identify_litigators_and_create_reports(input_folder="t1 input", output_folder="t1 output", result_folder="after t1 output", store_folder=CLEAN_STORE_FOLDER, ledger_path=LEDGER_PATH, stats_folder=STATS_FOLDER):
     # Ensure all necessary directories exist
     if not os.path.exists(result_folder):
         os.makedirs(result_folder)
 
-    # Find and read the 'all_clean'
-    clean_file_path = os.path.join(input_folder, next((f for f in os.listdir(input_folder) if "all_clean" in f and f.endswith('.xlsx')), None))
+    # Find the 'all_clean' and load its numbers from the clean store
+    clean_file_path = find_file(input_folder, "all_clean")
     if clean_file_path is None:
         print("No 'all_clean' found in the input folder.")
         return
-    clean_data = pd.read_excel(clean_file_path)
+    with measure('after_t1', 'read', os.path.basename(clean_file_path)) as values:
+        clean_numbers = sync_clean_store(clean_file_path, store_folder)
+        values['rows'] = len(clean_numbers)
 
     # Find and read the 'Litigator scrubbing' file
-    litigator_file_path = os.path.join(output_folder, next((f for f in os.listdir(output_folder) if "Litigator scrubbing" in f and f.endswith('.xlsx')), None))
+    litigator_file_path = find_file(output_folder, "Litigator scrubbing", litigator_extensions, newest=True)
     if litigator_file_path is None:
         print("No 'Litigator scrubbing' file found in the output folder.")
         return
-    litigator_data = pd.read_excel(litigator_file_path)
-
-    # Identify the numbers not in 'all_clean' and the associated IDs
-    missing_numbers = set(litigator_data['Numbers']) - set(clean_data['Numbers'])
-    missing_ids = litigator_data[litigator_data['Numbers'].isin(missing_numbers)]['ID'].unique()
+    with measure('after_t1', 'read', os.path.basename(litigator_file_path)) as values:
+        litigator_data = read_table_cached(litigator_file_path, usecols=['ID', 'Numbers'])
+        litigator_data = normalize_phone_columns(litigator_data, ['Numbers'])
+        values['rows'] = len(litigator_data)
 
     # Find and read the 'T1Skiptrace BST_out' file
-    t1_file_path = os.path.join(output_folder, next((f for f in os.listdir(output_folder) if "T1Skiptrace BST_out" in f and f.endswith('.xlsx')), None))
+    t1_file_path = find_file(output_folder, "T1Skiptrace BST_out")
     if t1_file_path is None:
         print("No 'T1Skiptrace BST_out' file found in the output folder.")
         return
-    t1_data = pd.read_excel(t1_file_path)
-
-    # Phone columns to check for Non Hits
-    phone_columns = [
-        'PH: Phone1', 'PH: Phone2', 'PH: Phone3', 'PH: Phone4', 'PH: Phone5',
-        'REL1: Phone 1', 'REL1: Phone 2', 'REL1: Phone 3',
-        'REL2: Phone 1', 'REL2: Phone 2', 'REL2: Phone 3',
-        'REL3: Phone 1', 'REL3: Phone 2', 'REL3: Phone 3'
-    ]
-
-    # Remove rows with missing IDs from the 'T1Skiptrace BST_out' file and save
-    t1_data_cleaned = t1_data[~t1_data['ID'].isin(missing_ids)]
-    cleaned_t1_file_path = os.path.join(result_folder, "T1Skiptrace BST_out_Cleaned.xlsx")
-    t1_data_cleaned.to_excel(cleaned_t1_file_path, index=False)
-    print(f"Cleaned T1Skiptrace file saved successfully at {cleaned_t1_file_path}")
-
-    # Save the IDs of litigators and their associated data
-    flagged_litigators_data = t1_data[t1_data['ID'].isin(missing_ids)]
-    flagged_litigators_file_path = os.path.join(result_folder, "Flagged_Litigators.xlsx")
-    flagged_litigators_data.to_excel(flagged_litigators_file_path, index=False)
-    print(f"Flagged Litigators file saved successfully at {flagged_litigators_file_path}")
-
-    # Identify Non Hits
-    non_hits = t1_data_cleaned[phone_columns].isnull().all(axis=1)
-    non_hits_data = t1_data_cleaned[non_hits]
-
-    # Prepare column rename mapping for Non Hits
-    column_rename = {
-        "Folio": "Folio",
-        "First Name": "FirstName",
-        "Last Name": "LastName",
-        "Mailing Address": "MailingAddress",
-        "Mailing city": "MailingCity",
-        "Mailing state": "MailingState",
-        "Mailing zip": "MailingZip",
-        "Property Address": "PropertyAddress",
-        "Property city": "PropertyCity",
-        "Property State": "PropertyState",
-        "Property zip": "PropertyZip"
-    }
-    non_hits_final = non_hits_data[list(column_rename.keys())].rename(columns=column_rename)
-    
-    # Check and transfer values from FirstName to LastName if LastName is empty
-    non_hits_final.loc[non_hits_final['LastName'].isna(), 'LastName'] = non_hits_final['FirstName']
-    non_hits_final.loc[non_hits_final['LastName'] == non_hits_final['FirstName'], 'FirstName'] = ""
-    
-    non_hits_file_path = os.path.join(result_folder, "Non_Hits.xlsx")
-    non_hits_final.to_excel(non_hits_file_path, index=False)
-    print(f"Non Hits file saved successfully at {non_hits_file_path}")
-
-    # Create the 'Import Flagged Litigators' file
-    selected_columns = [
-        'Folio', 'Property Address', 'Property zip', 'Bankrupcy',
-        'Estate', 'Golden Address', 'Golden city', 'Golden State', 'Golden Zip'
-    ]
-    additional_columns = {
-        'Property Skip Trace': 'BST',
-        'Number Source': 'T1Skiptrace',
-        'Phone number skip trace': 'BST',
-        'TAG': 'T1Skiptrace',
-        'Note': 'Possible Litigator',
-        'Action Plan': '30'
-    }
-
-    # Prepare data for 'Import Flagged Litigators' file
-    import_flagged_litigators_data = flagged_litigators_data[selected_columns].copy()
-    for col, value in additional_columns.items():
-        import_flagged_litigators_data[col] = value
-    
-    # Save 'Import Flagged Litigators'
-    import_flagged_litigators_file_path = os.path.join(result_folder, "Import_Flagged_Litigators.xlsx")
-    import_flagged_litigators_data.to_excel(import_flagged_litigators_file_path, index=False)
-    print(f"'Import Flagged Litigators' file saved successfully at {import_flagged_litigators_file_path}")
-
-def create_import_t1_skiptrace_file(output_folder="t1 output", result_folder="after t1 output"):
+    with measure('after_t1', 'read', os.path.basename(t1_file_path)) as values:
+        t1_data = apply_schema(read_excel_cached(t1_file_path))
+        t1_data = normalize_phone_columns(t1_data)
+        values['rows'] = len(t1_data)
+
+    with measure('after_t1', 'transform', 'classify') as values:
+        reports = build_reports(t1_data, litigator_data, clean_numbers)
+        values['rows'] = len(t1_data)
+
+    # Save every report, each one is a selection of the same classification
+    for report, file_name, description in report_files:
+        report_file_path = os.path.join(result_folder, file_name)
+        try:
+            with measure('after_t1', 'write', file_name) as values:
+                values['rows'] = len(reports[report])
+                write_excel(reports[report], report_file_path)
+            print(f"{description} saved successfully at {report_file_path}")
+        except Exception as e:
+            print(f"Failed to save {description}: {e}")
+
+    if ledger_path is not None:
+        with measure('after_t1', 'write', 'ledger'):
+            record_report_outcomes(t1_data, reports['category'], ledger_path)
+
+    # Add the batch to the statistics history, a stats_folder of None disables it
+    if stats_folder is not None:
+        try:
+            with measure('after_t1', 'write', 'batch stats'):
+                append_batch_stats(reports['stats'], batch_label(os.path.basename(t1_file_path), campaign_file_name(input_folder, t1_file_path)), stats_folder)
+        except Exception as e:
+            print(f"Failed to save the batch statistics: {e}")
+
+    return reports
+
+def create_import_t1_skiptrace_file(output_folder="t1 output", result_folder="after t1 output", input_folder="t1 input", store_folder=CLEAN_STORE_FOLDER):
     # Ensure the result directory exists
     if not os.path.exists(result_folder):
         os.makedirs(result_folder)
-    
-    # Define all columns to be included in the output
-    final_columns = [
-        'Folio', 'Property Address', 'Property zip', 'Bankrupcy', 'Estate', 
-        'Golden Address', 'Golden city', 'Golden State', 'Golden Zip', 
-        'PH: Phone1', 'PH: Phone1 Type', 'PH: Phone2', 'PH: Phone2 Type', 
-        'PH: Phone3', 'PH: Phone3 Type', 'PH: Phone4', 'PH: Phone4 Type', 
-        'PH: Phone5', 'PH: Phone5 Type', 'EMAIL: Email1', 'EMAIL: Email2', 
-        'EMAIL: Email3', 'EMAIL: Email4', 'EMAIL: Email5',
-        'REL1: Phone 1', 'REL1: Phone 2', 'REL1: Phone 3', 
-        'REL2: Phone 1', 'REL2: Phone 2', 'REL2: Phone 3', 
-        'REL3: Phone 1', 'REL3: Phone 2', 'REL3: Phone 3'
-    ]
-
-    # Additional columns to append
-    additional_columns = {
-        'Property Skip Trace': 'BST',
-        'Number Source': 'T1Skiptrace',
-        'Phone number skip trace': 'BST',
-        'TAG': 'T1Skiptrace'
-    }
 
     # Path to the cleaned T1 Skiptrace file
     cleaned_t1_file_path = os.path.join(result_folder, "T1Skiptrace BST_out_Cleaned.xlsx")
     
     # Read the 'T1Skiptrace BST_out_Cleaned.xlsx' file
     try:
-        t1_data_cleaned = pd.read_excel(cleaned_t1_file_path)
+        with measure('after_t1', 'read', os.path.basename(cleaned_t1_file_path)):
+            t1_data_cleaned = apply_schema(read_excel_cached(cleaned_t1_file_path))
     except Exception as e:
         print(f"An error occurred while reading the file: {e}")
         return
 
     # Attempt to read the clean and litigator files to find missing numbers
-    clean_file_path = os.path.join("t1 input", "all_clean.xlsx")
-    litigator_file_path = os.path.join(output_folder, "Litigator scrubbing.xlsx")
+    clean_file_path = os.path.join(input_folder, "all_clean.xlsx")
+    litigator_file_path = find_file(output_folder, "Litigator scrubbing", litigator_extensions, newest=True)
 
     try:
-        clean_data = pd.read_excel(clean_file_path)
-        litigator_data = pd.read_excel(litigator_file_path)
+        with measure('after_t1', 'read', os.path.basename(clean_file_path)):
+            clean_numbers = sync_clean_store(clean_file_path, store_folder)
+        with measure('after_t1', 'read', 'Litigator scrubbing'):
+            litigator_data = read_table_cached(litigator_file_path, usecols=['ID', 'Numbers'])
     except Exception as e:
         print(f"Failed to read input files: {e}")
         return
 
-    # Identify Numbers not in the 'all_clean' but in 'Litigator scrubbing'
-    missing_numbers = set(litigator_data['Numbers']) - set(clean_data['Numbers'])
+    # Normalize the phone columns to Int64 10-digit keys so they compare the same across files
+    t1_data_cleaned = normalize_phone_columns(t1_data_cleaned)
+    litigator_data = normalize_phone_columns(litigator_data, ['Numbers'])
 
-    # Select only the rows from litigator_data that have the missing Numbers
-    flagged_litigators_data = litigator_data[litigator_data['Numbers'].isin(missing_numbers)]
+    try:
+        with measure('after_t1', 'transform', 'import t1 skiptrace') as values:
+            flagged_litigators_data, import_t1_skiptrace_data = build_import_t1_skiptrace(t1_data_cleaned, litigator_data, clean_numbers)
+            values['rows'] = len(import_t1_skiptrace_data)
+    except Exception as e:
+        print(f"Failed to process and save 'Import T1 Skiptrace' file: {e}")
+        return
 
     # Save the flagged litigators to a new Excel file
     testing_flagged_litigators_path = os.path.join(result_folder, "Testing_Flagged_Litigators.xlsx")
     try:
-        flagged_litigators_data[['ID', 'Numbers']].to_excel(testing_flagged_litigators_path, index=False)
+        with measure('after_t1', 'write', os.path.basename(testing_flagged_litigators_path)) as values:
+            values['rows'] = len(flagged_litigators_data)
+            write_excel(flagged_litigators_data, testing_flagged_litigators_path)
         print(f"Testing Flagged Litigators file saved successfully at {testing_flagged_litigators_path}")
     except Exception as e:
         print(f"Failed to save 'Testing Flagged Litigators' file: {e}")
 
-    # Continue with existing logic to finalize the import T1 skiptrace file
+    # Save the processed data to an Excel file
+    import_t1_skiptrace_file_path = os.path.join(result_folder, "Import_T1_Skiptrace.xlsx")
     try:
-        # Add missing columns with None values to ensure all expected columns are present
-        for column in final_columns:
-            if column not in t1_data_cleaned.columns:
-                t1_data_cleaned[column] = None
-
-        # Filter rows to include only those with any non-empty phone information
-        t1_data_cleaned = t1_data_cleaned.dropna(subset=[col for col in final_columns if 'Phone' in col], how='all')
-
-        # Reorder the DataFrame according to the final_columns list
-        t1_data_cleaned = t1_data_cleaned[final_columns]
-
-        # Add additional columns with predefined values
-        for column, value in additional_columns.items():
-            t1_data_cleaned[column] = value
-
-        # Save the processed data to an Excel file
-        import_t1_skiptrace_file_path = os.path.join(result_folder, "Import_T1_Skiptrace.xlsx")
-        t1_data_cleaned.to_excel(import_t1_skiptrace_file_path, index=False)
+        with measure('after_t1', 'write', os.path.basename(import_t1_skiptrace_file_path)) as values:
+            values['rows'] = len(import_t1_skiptrace_data)
+            write_excel(import_t1_skiptrace_data, import_t1_skiptrace_file_path)
         print(f"'Import T1 Skiptrace' file saved successfully at {import_t1_skiptrace_file_path}")
     except Exception as e:
-        print(f"Failed to process and save 'Import T1 Skiptrace' file: {e}")      
+        print(f"Failed to process and save 'Import T1 Skiptrace' file: {e}")
+
+    return flagged_litigators_data, import_t1_skiptrace_data
 
 
 
 # Run the function
-identify_litigators_and_create_reports()
-create_import_t1_skiptrace_file()
+if __name__ == "__main__":
+    with run_report_from_env("after t1 output"):
+        identify_litigators_and_create_reports()
 
 
 
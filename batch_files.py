@@ -0,0 +1,20 @@
+import os
+
+def pair_batches(t1_input_folder="t1 input", report_unpaired=True):
+    # Match every T1Skiptrace BST_out file with the campaign file it was traced from
+    files = [f for f in os.listdir(t1_input_folder) if f.endswith('.xlsx')]
+    t1_files = sorted(f for f in files if "T1Skiptrace BST_out" in f)
+    campaign_files = sorted(f for f in files if ("Cold Calling" in f or "SMS" in f) and f not in t1_files)
+
+    pairs = []
+    for t1_file in t1_files:
+        # The vendor file is named after the campaign file, so prefer the longest campaign name it contains
+        candidates = [f for f in campaign_files if f[:-len('.xlsx')] in t1_file]
+        if not candidates and len(t1_files) == 1 and len(campaign_files) == 1:
+            candidates = campaign_files
+        if not candidates:
+            if report_unpaired:
+                print(f"No Cold Calling or SMS file matches {t1_file}, skipping it.")
+            continue
+        pairs.append((t1_file, max(candidates, key=len)))
+    return pairs
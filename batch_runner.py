@@ -0,0 +1,212 @@
+import os
+import shutil
+import sqlite3
+import argparse
+import traceback
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from batch_files import pair_batches
+from xlsx_cache import file_digest
+
+# Folder holding the job queue database and one workspace per job
+JOBS_FOLDER = "jobs"
+JOBS_DB = "jobs.db"
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+@contextmanager
+def jobs_connection(jobs_folder=JOBS_FOLDER):
+    if not os.path.exists(jobs_folder):
+        os.makedirs(jobs_folder)
+
+    connection = sqlite3.connect(os.path.join(jobs_folder, JOBS_DB), timeout=60)
+    connection.row_factory = sqlite3.Row
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            t1_file TEXT NOT NULL,
+            t1_digest TEXT,
+            campaign_file TEXT NOT NULL,
+            clean_file TEXT NOT NULL,
+            workspace TEXT,
+            status TEXT NOT NULL,
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            result TEXT,
+            error TEXT
+        )
+    """)
+    # Queues created before the T1 file digest was recorded get the column, their jobs have no digest
+    if 't1_digest' not in {row['name'] for row in connection.execute("PRAGMA table_info(jobs)")}:
+        connection.execute("ALTER TABLE jobs ADD COLUMN t1_digest TEXT")
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+def enqueue_job(t1_file_path, campaign_file_path, clean_file_path, jobs_folder=JOBS_FOLDER, t1_digest=None):
+    # The T1 file digest identifies the batch, the vendor file names repeat every week
+    t1_digest = t1_digest or file_digest(t1_file_path)
+    with jobs_connection(jobs_folder) as connection:
+        cursor = connection.execute(
+            "INSERT INTO jobs (t1_file, t1_digest, campaign_file, clean_file, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+            (os.path.abspath(t1_file_path), t1_digest, os.path.abspath(campaign_file_path), os.path.abspath(clean_file_path), now()),
+        )
+        return cursor.lastrowid
+
+def enqueue_discovered(t1_input_folder="t1 input", jobs_folder=JOBS_FOLDER):
+    # Queue every T1Skiptrace/campaign pair not already queued or processed
+    clean_file = next((f for f in os.listdir(t1_input_folder) if "all_clean" in f and f.endswith('.xlsx')), None)
+    if clean_file is None:
+        print("No 'all_clean' found in the input folder.")
+        return []
+
+    with jobs_connection(jobs_folder) as connection:
+        known = {row['t1_digest']: row['id'] for row in connection.execute("SELECT id, t1_digest FROM jobs WHERE status != 'failed' AND t1_digest IS NOT NULL")}
+
+    job_ids = []
+    for t1_file, campaign_file in pair_batches(t1_input_folder):
+        t1_file_path = os.path.join(t1_input_folder, t1_file)
+        t1_digest = file_digest(t1_file_path)
+        if t1_digest in known:
+            print(f"Skipping {t1_file}, the same file was already queued as job {known[t1_digest]}")
+            continue
+        job_id = enqueue_job(t1_file_path, os.path.join(t1_input_folder, campaign_file), os.path.join(t1_input_folder, clean_file), jobs_folder, t1_digest)
+        known[t1_digest] = job_id
+        print(f"Queued job {job_id}: {t1_file} with {campaign_file}")
+        job_ids.append(job_id)
+    return job_ids
+
+def list_jobs(jobs_folder=JOBS_FOLDER, status=None):
+    with jobs_connection(jobs_folder) as connection:
+        if status is None:
+            return [dict(row) for row in connection.execute("SELECT * FROM jobs ORDER BY id")]
+        return [dict(row) for row in connection.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,))]
+
+def get_job(job_id, jobs_folder=JOBS_FOLDER):
+    with jobs_connection(jobs_folder) as connection:
+        row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return None if row is None else dict(row)
+
+def update_job(job_id, jobs_folder=JOBS_FOLDER, **values):
+    with jobs_connection(jobs_folder) as connection:
+        assignments = ', '.join(f"{column} = ?" for column in values)
+        connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*values.values(), job_id))
+
+def prepare_workspace(job, jobs_folder=JOBS_FOLDER):
+    # Each job gets its own "t1 input", "t1 output" and "after t1 output" folders.
+    # The inputs are copied, hard links would share the file with the next week's batch written in place.
+    workspace = os.path.join(jobs_folder, f"job_{job['id']}")
+    shutil.rmtree(workspace, ignore_errors=True)
+    t1_input_folder = os.path.join(workspace, "t1 input")
+    os.makedirs(t1_input_folder)
+    for source in (job['t1_file'], job['campaign_file'], job['clean_file']):
+        shutil.copy2(source, os.path.join(t1_input_folder, os.path.basename(source)))
+
+    t1_file_path = os.path.join(t1_input_folder, os.path.basename(job['t1_file']))
+    if job['t1_digest'] and file_digest(t1_file_path) != job['t1_digest']:
+        raise RuntimeError(f"{job['t1_file']} changed since the job was queued, queue the new file as its own job.")
+    return workspace
+
+def run_job(job_id, jobs_folder=JOBS_FOLDER, chunk_size=None):
+    # Run before_t1 and after_t1 for one batch inside its workspace, logging to job.log
+    from before_t1 import integrate_skiptrace_data
+    from after_t1 import identify_litigators_and_create_reports
+
+    try:
+        # A job whose source files were moved since it was queued fails instead of staying queued
+        job = get_job(job_id, jobs_folder)
+        if job is None:
+            raise ValueError(f"No job {job_id}.")
+        workspace = prepare_workspace(job, jobs_folder)
+        update_job(job_id, jobs_folder, status='running', workspace=workspace, started_at=now(), error=None)
+
+        t1_input_folder = os.path.join(workspace, "t1 input")
+        t1_output_folder = os.path.join(workspace, "t1 output")
+        result_folder = os.path.join(workspace, "after t1 output")
+        with open(os.path.join(workspace, "job.log"), 'w') as log, redirect_stdout(log), redirect_stderr(log):
+            integrate_skiptrace_data(t1_input_folder, t1_output_folder, chunk_size=chunk_size)
+            reports = identify_litigators_and_create_reports(t1_input_folder, t1_output_folder, result_folder)
+        if reports is None:
+            raise RuntimeError(f"The batch did not produce its reports, see {os.path.join(workspace, 'job.log')}")
+        result = ', '.join(f"{category}: {count}" for category, count in reports['category'].value_counts().items())
+        update_job(job_id, jobs_folder, status='done', finished_at=now(), result=result)
+    except Exception as e:
+        update_job(job_id, jobs_folder, status='failed', finished_at=now(), error=f"{e}\n{traceback.format_exc()}")
+    return get_job(job_id, jobs_folder)
+
+def run_queued_jobs(jobs_folder=JOBS_FOLDER, workers=2, chunk_size=None):
+    # Process the queued jobs through a bounded pool of worker processes
+    job_ids = [job['id'] for job in list_jobs(jobs_folder, status='queued')]
+    if not job_ids:
+        print("No queued jobs.")
+        return []
+
+    finished = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_job, job_id, jobs_folder, chunk_size): job_id for job_id in job_ids}
+        for future in as_completed(futures):
+            try:
+                job = future.result()
+            except Exception as e:
+                print(f"Job {futures[future]} failed: {e}")
+                continue
+            print(f"Job {job['id']} {job['status']}: {job['result'] or job['error'].splitlines()[0]}")
+            finished.append(job)
+    return finished
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Queue and run T1Skiptrace batches in isolated workspaces.")
+    parser.add_argument('--jobs-folder', default=JOBS_FOLDER)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    discover = commands.add_parser('discover', help="queue every T1Skiptrace/campaign pair found in the input folder")
+    discover.add_argument('--input', default="t1 input")
+
+    enqueue = commands.add_parser('enqueue', help="queue one batch")
+    enqueue.add_argument('t1_file')
+    enqueue.add_argument('campaign_file')
+    enqueue.add_argument('clean_file')
+
+    listing = commands.add_parser('list', help="list the jobs")
+    listing.add_argument('--status')
+
+    show = commands.add_parser('show', help="show one job and its log")
+    show.add_argument('job_id', type=int)
+
+    run = commands.add_parser('run', help="run the queued jobs")
+    run.add_argument('--workers', type=int, default=2)
+    run.add_argument('--chunk-size', type=int)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'discover':
+        enqueue_discovered(args.input, args.jobs_folder)
+    elif args.command == 'enqueue':
+        job_id = enqueue_job(args.t1_file, args.campaign_file, args.clean_file, args.jobs_folder)
+        print(f"Queued job {job_id}")
+    elif args.command == 'list':
+        for job in list_jobs(args.jobs_folder, args.status):
+            print(f"{job['id']:>5}  {job['status']:<8} {os.path.basename(job['t1_file'])} <- {os.path.basename(job['campaign_file'])}")
+    elif args.command == 'show':
+        job = get_job(args.job_id, args.jobs_folder)
+        if job is None:
+            print(f"No job {args.job_id}.")
+            return 1
+        for column, value in job.items():
+            print(f"{column}: {value}")
+        log_path = os.path.join(job['workspace'] or '', "job.log")
+        if job['workspace'] and os.path.exists(log_path):
+            with open(log_path) as f:
+                print(f"\n{f.read()}")
+    elif args.command == 'run':
+        run_queued_jobs(args.jobs_folder, args.workers, args.chunk_size)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
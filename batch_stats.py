@@ -0,0 +1,187 @@
+import os
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+from phones import phone_columns
+from xlsx_io import module_available
+
+# Append-only history of per-batch aggregates, one Parquet file per batch
+STATS_FOLDER = os.path.join("stats", "batch_history")
+
+# Phone types reported by the vendor, anything else is counted as other
+phone_types = ['Mobile', 'Landline', 'VoIP']
+phone_type_columns = [f'PH: Phone{i} Type' for i in range(1, 6)]
+
+# Counts summed over a window of batches before dividing, so big and small batches weigh by their records
+count_columns = (
+    ['records', 'hits', 'non_hits', 'litigators', 'phones']
+    + [f'filled {column}' for column in phone_columns]
+    + [f'type {phone_type.lower()}' for phone_type in phone_types] + ['type other']
+)
+
+def batch_stats(t1_data, category):
+    # Aggregate one classified batch from its phone columns, without building any report
+    codes = np.asarray(category.codes)
+    litigators, hits, non_hits = np.bincount(codes, minlength=3)[:3]
+    filled = t1_data.reindex(columns=phone_columns).notna().to_numpy()
+    records = len(t1_data)
+
+    stats = {
+        'records': records,
+        'hits': int(hits),
+        'non_hits': int(non_hits),
+        'litigators': int(litigators),
+        'phones': int(filled.sum()),
+    }
+    stats.update({f'filled {column}': int(count) for column, count in zip(phone_columns, filled.sum(axis=0))})
+
+    # Phone type mix over the PH slots
+    types = t1_data.reindex(columns=phone_type_columns).stack()
+    type_counts = types.astype('string').str.lower().value_counts()
+    known = 0
+    for phone_type in phone_types:
+        count = int(type_counts.get(phone_type.lower(), 0))
+        stats[f'type {phone_type.lower()}'] = count
+        known += count
+    stats['type other'] = int(type_counts.sum()) - known
+
+    stats['hit_rate'] = hits / records if records else np.nan
+    stats['litigator_rate'] = litigators / records if records else np.nan
+    stats['phones_per_record'] = stats['phones'] / records if records else np.nan
+    return stats
+
+def batch_label(t1_file_name, campaign_file_name=None):
+    # Name the batch after the campaign file it was traced from, else after the vendor file
+    if campaign_file_name is not None:
+        return campaign_file_name
+    return t1_file_name[len('modified_'):] if t1_file_name.startswith('modified_') else t1_file_name
+
+def append_batch_stats(stats, batch, stats_folder=STATS_FOLDER):
+    # Write the batch as a new Parquet file, existing files are never rewritten
+    if not module_available('pyarrow'):
+        print("pyarrow is not installed, the batch statistics were not saved.")
+        return None
+    if not os.path.exists(stats_folder):
+        os.makedirs(stats_folder)
+
+    # The run id tells apart batches that come from files with the same name
+    recorded_at = datetime.now(timezone.utc)
+    run_id = f"{recorded_at:%Y%m%dT%H%M%S%f}-{os.getpid()}"
+    row = pd.DataFrame([{'batch': batch, 'run_id': run_id, 'recorded_at': recorded_at, **stats}])
+    row[count_columns] = row[count_columns].astype('int64')
+
+    # Files starting with a dot are ignored by the Parquet readers until they are complete
+    file_name = f"batch-{run_id}.parquet"
+    temp_path = os.path.join(stats_folder, f".{file_name}.tmp")
+    row.to_parquet(temp_path, index=False)
+    os.replace(temp_path, os.path.join(stats_folder, file_name))
+    return os.path.join(stats_folder, file_name)
+
+def history_files(stats_folder=STATS_FOLDER):
+    if not os.path.exists(stats_folder):
+        return []
+    return sorted(os.path.join(stats_folder, f) for f in os.listdir(stats_folder) if f.endswith('.parquet') and not f.startswith('.'))
+
+def read_history(files, columns=None):
+    # Read only the requested columns of the given files, ordered by time
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    columns = None if columns is None else sorted(set(columns) | {'recorded_at'})
+    # Files written before a column was added read it as null
+    schema = pa.unify_schemas([pq.read_schema(path) for path in files])
+    history = pq.ParquetDataset(files, schema=schema).read(columns=columns).to_pandas()
+    return history.sort_values('recorded_at', kind='stable').reset_index(drop=True)
+
+def load_history(stats_folder=STATS_FOLDER, columns=None):
+    files = history_files(stats_folder)
+    if not files:
+        return pd.DataFrame(columns=['batch', 'run_id', 'recorded_at'] + count_columns)
+    return read_history(files, columns)
+
+def compact_history(stats_folder=STATS_FOLDER):
+    # Merge the per-batch files into one, so queries over thousands of batches open a single file
+    files = history_files(stats_folder)
+    if len(files) < 2:
+        return None
+    history = read_history(files)
+    file_name = f"history-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}.parquet"
+    temp_path = os.path.join(stats_folder, f".{file_name}.tmp")
+    history.to_parquet(temp_path, index=False)
+    os.replace(temp_path, os.path.join(stats_folder, file_name))
+
+    # Only the files merged above are removed, batches appended meanwhile are kept
+    for path in files:
+        os.remove(path)
+    print(f"Compacted {len(files)} files ({len(history)} batches) into {file_name}")
+    return os.path.join(stats_folder, file_name)
+
+def rolling_stats(stats_folder=STATS_FOLDER, window=20, slots=False):
+    # Rates over the last `window` batches at each batch, weighted by their record counts
+    columns = ['records', 'hits', 'litigators', 'phones']
+    if slots:
+        columns += [f'filled {column}' for column in phone_columns]
+    history = load_history(stats_folder, ['batch', 'run_id'] + columns)
+    totals = history[columns].rolling(window, min_periods=1).sum()
+
+    rolling = history[['batch', 'run_id', 'recorded_at', 'records']].copy()
+    rolling['hit_rate'] = totals['hits'] / totals['records']
+    rolling['litigator_rate'] = totals['litigators'] / totals['records']
+    rolling['phones_per_record'] = totals['phones'] / totals['records']
+    if slots:
+        for column in phone_columns:
+            rolling[f'fill {column}'] = totals[f'filled {column}'] / totals['records']
+    return rolling
+
+def summary_stats(stats_folder=STATS_FOLDER, last=None):
+    # Totals and rates over all batches, or the last ones, including the fill rate per slot and the type mix
+    history = load_history(stats_folder, count_columns)
+    if last:
+        history = history.tail(last)
+    totals = history[count_columns].sum()
+    records = totals['records']
+    types = totals[[column for column in count_columns if column.startswith('type ')]]
+
+    summary = pd.Series({'batches': len(history), 'records': records})
+    summary['hit_rate'] = totals['hits'] / records if records else np.nan
+    summary['litigator_rate'] = totals['litigators'] / records if records else np.nan
+    summary['phones_per_record'] = totals['phones'] / records if records else np.nan
+    for column in phone_columns:
+        summary[f'fill {column}'] = totals[f'filled {column}'] / records if records else np.nan
+    for column, count in types.items():
+        summary[f'{column} share'] = count / types.sum() if types.sum() else np.nan
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the per-batch phone hit statistics saved by after_t1.py.")
+    parser.add_argument('--stats-folder', default=STATS_FOLDER)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    rolling = commands.add_parser('rolling', help="rolling rates over a window of batches")
+    rolling.add_argument('--window', type=int, default=20)
+    rolling.add_argument('--last', type=int, default=20, help="number of batches to show")
+    rolling.add_argument('--slots', action='store_true', help="include the fill rate of each phone slot")
+
+    summary = commands.add_parser('summary', help="rates over all batches, or the last N")
+    summary.add_argument('--last', type=int)
+
+    commands.add_parser('compact', help="merge the per-batch files into one")
+    args = parser.parse_args(argv)
+
+    if args.command == 'compact':
+        compact_history(args.stats_folder)
+        return 0
+
+    if not history_files(args.stats_folder):
+        print(f"No batch statistics found in {args.stats_folder}.")
+        return 1
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.3f}'.format):
+        if args.command == 'rolling':
+            print(rolling_stats(args.stats_folder, args.window, args.slots).tail(args.last).to_string(index=False))
+        else:
+            print(summary_stats(args.stats_folder, args.last).to_string())
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,94 +1,287 @@
 import os
+import numpy as np
 import pandas as pd
 
-def integrate_skiptrace_data(input_folder="t1 input", output_folder="t1 output"):
+from addresses import owner_address_keys
+from batch_files import pair_batches
+from instrumentation import measure, run_report_from_env
+from phones import phone_columns, normalize_phone_columns
+from schema import apply_schema
+from xlsx_cache import read_excel_cached
+from xlsx_io import iter_excel_chunks, open_chunk_writer, write_excel, write_table
+
+# Columns renamed from the T1Skiptrace vendor names
+columns_to_rename = {
+    'INPUT: First Name': 'First Name',
+    'INPUT: Last Name': 'Last Name',
+    'INPUT: Address 1': 'Mailing Address',
+    'INPUT: City': 'Mailing city',
+    'INPUT: State': 'Mailing state',
+    'INPUT: Zip Code': 'Mailing zip',
+    'INPUT: Extra 1': 'Property Address',
+    'INPUT: Extra 2': 'Property city',
+    'INPUT: Extra 3': 'Property State',
+    'INPUT: Extra 4': 'Property zip',
+    'BNK: Bankrupt (Y/N)': 'Bankrupcy',
+    'DEC: Deceased (Y/N)': 'Estate',
+    'ADD: Address1': 'Golden Address',
+    'ADD: Address1 City': 'Golden city',
+    'ADD: Address1 State': 'Golden State',
+    'ADD: Address1 Zip': 'Golden Zip'
+}
+
+def replace_flags(flags):
+    # Y/N flags become '1'/'' and categorical flags only have their categories renamed
+    flag_values = {'N': '', 'Y': '1'}
+    if isinstance(flags.dtype, pd.CategoricalDtype):
+        return flags.cat.rename_categories(lambda value: flag_values.get(value, value))
+    return flags.replace(flag_values)
+
+def transform_t1_data(t1_data, folios, first_id=1):
+    t1_data = t1_data.copy()
+
+    # Insert the Folio column at the beginning of the T1Skiptrace file
+    t1_data.insert(0, 'Folio', folios)
+
+    # Modify DEC and BNK columns
+    t1_data['DEC: Deceased (Y/N)'] = replace_flags(t1_data['DEC: Deceased (Y/N)'])
+    t1_data['BNK: Bankrupt (Y/N)'] = replace_flags(t1_data['BNK: Bankrupt (Y/N)'])
+
+    t1_data.rename(columns=columns_to_rename, inplace=True)
+
+    # Add ID column starting at 1 and incrementing by 1 for each row
+    t1_data.insert(0, 'ID', range(first_id, first_id + len(t1_data)))
+
+    # Normalize the phone columns to Int64 10-digit keys so they compare the same across files
+    t1_data = normalize_phone_columns(t1_data)
+
+    return t1_data
+
+# Campaign columns echoed back by the vendor in its INPUT: columns, used to match the rows
+join_columns = {
+    'OwnerFirstName': 'INPUT: First Name',
+    'OwnerLastName': 'INPUT: Last Name',
+    'MailingAddress': 'INPUT: Address 1',
+    'MailingZip': 'INPUT: Zip Code',
+}
+
+def campaign_join_usecols(column):
+    # Only the Folio and the matching columns are needed from the Cold Calling/SMS file
+    return column == 'Folio' or column in join_columns
+
+def can_join(t1_columns, campaign_columns):
+    return all(column in campaign_columns for column in join_columns) and all(column in t1_columns for column in join_columns.values())
+
+class FolioMatcher:
+    # Hash join of vendor rows to campaign rows on owner name + mailing address + zip, chunk by chunk
+    def __init__(self, campaign_data):
+        self.campaign_data = campaign_data.reset_index(drop=True)
+        keys, matchable = owner_address_keys(*(self.campaign_data[column] for column in join_columns))
+
+        # Repeated keys are paired in order, so the n-th vendor copy gets the n-th campaign row
+        campaign = pd.DataFrame({'key': keys, 'occurrence': pd.Series(keys).groupby(keys).cumcount().to_numpy(), 'position': np.arange(len(keys))})
+        self.campaign = campaign[matchable]
+        self.seen = pd.Series(dtype='int64')
+        self.matched = np.zeros(len(keys), dtype=bool)
+        self.unmatched = []
+
+    def match(self, t1_data):
+        # Return the Folios of the matched rows and the matched rows themselves, keeping unmatched rows aside
+        keys, matchable = owner_address_keys(*(t1_data[column] for column in join_columns.values()))
+        occurrence = pd.Series(keys).groupby(keys).cumcount().to_numpy() + self.seen.reindex(keys).fillna(0).to_numpy(dtype='int64')
+        self.seen = self.seen.add(pd.Series(keys).value_counts(), fill_value=0)
+
+        chunk = pd.DataFrame({'key': keys, 'occurrence': occurrence})
+        positions = chunk.merge(self.campaign, on=['key', 'occurrence'], how='left')['position'].to_numpy()
+        found = matchable & ~np.isnan(positions)
+        positions = positions[found].astype('int64')
+        self.matched[positions] = True
+
+        if not found.all():
+            self.unmatched.append(t1_data.loc[~found, list(join_columns.values())])
+        return self.campaign_data['Folio'].to_numpy()[positions], t1_data[found]
+
+    def unmatched_records(self):
+        # Vendor rows without a campaign row and campaign rows the vendor didn't return, in one report
+        not_found = pd.concat(self.unmatched, ignore_index=True) if self.unmatched else pd.DataFrame(columns=list(join_columns.values()))
+        not_found = not_found.rename(columns=columns_to_rename)
+        not_found.insert(0, 'Unmatched', "Not found in the Cold Calling/SMS file")
+
+        not_returned = self.campaign_data.loc[~self.matched, ['Folio'] + list(join_columns)]
+        not_returned = not_returned.rename(columns={campaign: columns_to_rename[t1] for campaign, t1 in join_columns.items()})
+        not_returned.insert(0, 'Unmatched', "Not returned in T1Skiptrace BST_out")
+        return pd.concat([not_found, not_returned], ignore_index=True)[['Unmatched', 'Folio'] + [columns_to_rename[t1] for t1 in join_columns.values()]]
+
+# Not a single match means the T1Skiptrace file was traced from another campaign file
+no_match_message = "None of the T1Skiptrace BST_out rows match the Cold Calling/SMS file, check that the two files belong to the same batch."
+
+def prepare_t1_data(t1_data, calling_sms_data):
+    # Files without the matching columns can only be aligned by position
+    if not can_join(t1_data.columns, calling_sms_data.columns):
+        # Verify the number of rows matches
+        if len(t1_data) != len(calling_sms_data):
+            print("The number of rows in T1Skiptrace BST_out does not match the Cold Calling/SMS file.")
+            return None, None
+        return transform_t1_data(t1_data, calling_sms_data['Folio'].to_numpy()), None
+
+    matcher = FolioMatcher(calling_sms_data)
+    folios, matched_data = matcher.match(t1_data)
+    if len(matched_data) == 0 and len(t1_data):
+        print(no_match_message)
+        return None, None
+    t1_data = matched_data
+    return transform_t1_data(t1_data, folios), matcher.unmatched_records()
+
+def report_unmatched(unmatched):
+    for reason, count in unmatched['Unmatched'].value_counts().items():
+        print(f"{count} records {reason[0].lower()}{reason[1:]}.")
+
+# Columns of the Litigator scrubbing file, after_t1.py reads these
+litigator_columns = ['ID', 'Numbers']
+
+def build_litigator_data(t1_data):
+    # Prepare the Litigator scrubbing file
+    litigator_data = t1_data[['ID'] + phone_columns]
+    litigator_data = litigator_data.set_index('ID')
+    litigator_data = litigator_data.stack().reset_index(name='Numbers').drop('level_1', axis=1)
+    return litigator_data[litigator_data['Numbers'].notnull()]
+
+def stream_t1_data(t1_file_path, calling_sms_data, t1_output_path, litigator_output_path, chunk_size=50000):
+    # Transform the T1Skiptrace file chunk by chunk, writing both outputs incrementally
+    folios = calling_sms_data['Folio'].to_numpy()
+    matcher = None
+    t1_writer = open_chunk_writer(t1_output_path)
+    litigator_writer = open_chunk_writer(litigator_output_path, litigator_columns)
+    rows = 0
+    try:
+        for index, t1_chunk in enumerate(iter_excel_chunks(t1_file_path, chunk_size)):
+            t1_chunk = apply_schema(t1_chunk)
+            if index == 0 and can_join(t1_chunk.columns, calling_sms_data.columns):
+                matcher = FolioMatcher(calling_sms_data)
+
+            if matcher is not None:
+                chunk_folios, t1_chunk = matcher.match(t1_chunk)
+            else:
+                # Verify the number of rows matches as the chunks come in
+                if rows + len(t1_chunk) > len(folios):
+                    break
+                chunk_folios = folios[rows:rows + len(t1_chunk)]
+            t1_chunk = transform_t1_data(t1_chunk, chunk_folios, first_id=rows + 1)
+            t1_writer.write(t1_chunk)
+            litigator_writer.write(build_litigator_data(t1_chunk))
+            rows += len(t1_chunk)
+        else:
+            # Vendor rows without a single match mean the files don't belong to the same batch
+            if matcher is not None and (rows or not matcher.seen.sum()):
+                return rows, matcher.unmatched_records()
+            if rows == len(folios):
+                return rows, None
+    finally:
+        t1_writer.close()
+        litigator_writer.close()
+
+    # The partial outputs would be mistaken for a complete run, so remove them
+    print(no_match_message if matcher is not None else "The number of rows in T1Skiptrace BST_out does not match the Cold Calling/SMS file.")
+    for output_path in (t1_output_path, litigator_output_path):
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    return None, None
+
+def save_unmatched(unmatched, output_folder):
+    # Keep the records that couldn't be matched for review instead of failing the batch
+    unmatched_path = os.path.join(output_folder, "Unmatched records.xlsx")
+    if unmatched is None or unmatched.empty:
+        # A report left over from an earlier run would no longer be accurate
+        if os.path.exists(unmatched_path):
+            os.remove(unmatched_path)
+        return
+    report_unmatched(unmatched)
+    try:
+        with measure('before_t1', 'write', os.path.basename(unmatched_path)):
+            write_excel(unmatched, unmatched_path)
+        print(f"Unmatched records file saved successfully at {unmatched_path}")
+    except Exception as e:
+        print(f"Failed to save the unmatched records: {e}")
+
+def integrate_skiptrace_data(input_folder="t1 input", output_folder="t1 output", chunk_size=None, litigator_format="xlsx"):
     # Ensure the output directory exists
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     
     # Find the T1Skiptrace and Cold Calling or SMS files in the input folder
-    t1_files = [f for f in os.listdir(input_folder) if "T1Skiptrace BST_out" in f and f.endswith('.xlsx')]
-    calling_sms_files = [f for f in os.listdir(input_folder) if ("Cold Calling" in f or "SMS" in f) and f.endswith('.xlsx')]
-    
-    if not t1_files:
-        print("No T1Skiptrace BST_out file found.")
+    # Pair each T1Skiptrace BST_out file with the Cold Calling or SMS file it was traced from, by name
+    pairs = pair_batches(input_folder)
+    if not pairs:
+        print("No T1Skiptrace BST_out file with a matching Cold Calling or SMS file found.")
         return
-    if not calling_sms_files:
-        print("No Cold Calling or SMS file found.")
+    if len(pairs) > 1:
+        print(f"Found {len(pairs)} T1Skiptrace batches, only {pairs[0][0]} is processed. Use batch_runner.py to process several batches.")
 
+    t1_file_path = os.path.join(input_folder, pairs[0][0])
+    calling_sms_file_path = os.path.join(input_folder, pairs[0][1])
+    t1_output_path = os.path.join(output_folder, f"modified_{os.path.basename(t1_file_path)}")
+    litigator_output_path = os.path.join(output_folder, f"Litigator scrubbing.{litigator_format}")
+
+    # A Litigator scrubbing file left in another format by an earlier run would be read by after_t1.py
+    for extension in ('xlsx', 'csv', 'parquet'):
+        stale_path = os.path.join(output_folder, f"Litigator scrubbing.{extension}")
+        if extension != litigator_format and os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    # Streaming mode keeps at most one chunk of the T1Skiptrace file in memory
+    if chunk_size:
+        try:
+            with measure('before_t1', 'read', os.path.basename(calling_sms_file_path)) as values:
+                calling_sms_data = read_excel_cached(calling_sms_file_path, usecols=campaign_join_usecols)
+                values['rows'] = len(calling_sms_data)
+            with measure('before_t1', 'stream', os.path.basename(t1_file_path)) as values:
+                rows, unmatched = stream_t1_data(t1_file_path, calling_sms_data, t1_output_path, litigator_output_path, chunk_size)
+                values['rows'] = rows
+        except Exception as e:
+            print(f"Failed to stream the T1Skiptrace file: {e}")
+            return
+        if rows is not None:
+            print(f"Modified file saved successfully at {t1_output_path}")
+            print(f"Litigator scrubbing file saved successfully at {litigator_output_path}")
+            save_unmatched(unmatched, output_folder)
         return
 
     # Read the Excel files                           
-    t1_file_path = os.path.join(input_folder, t1_files[0])
-    calling_sms_file_path = os.path.join(input_folder, calling_sms_files[0])
     try:
-        t1_data = pd.read_excel(t1_file_path)
-        calling_sms_data = pd.read_excel(calling_sms_file_path)
+        with measure('before_t1', 'read', os.path.basename(t1_file_path)) as values:
+            t1_data = apply_schema(read_excel_cached(t1_file_path))
+            values['rows'] = len(t1_data)
+        with measure('before_t1', 'read', os.path.basename(calling_sms_file_path)) as values:
+            calling_sms_data = read_excel_cached(calling_sms_file_path, usecols=campaign_join_usecols)
+            values['rows'] = len(calling_sms_data)
     except Exception as e:
         print(f"Failed to read the files: {e}")
         return
     
-    # Verify the number of rows matches
-    if len(t1_data) != len(calling_sms_data):
-        print("The number of rows in T1Skiptrace BST_out does not match the Cold Calling/SMS file.")
+    with measure('before_t1', 'transform', 'prepare') as values:
+        t1_data, unmatched = prepare_t1_data(t1_data, calling_sms_data)
+        values['rows'] = None if t1_data is None else len(t1_data)
+    if t1_data is None:
         return
-    
-    # Insert the Folio column at the beginning of the T1Skiptrace file
-    t1_data.insert(0, 'Folio', calling_sms_data['Folio'])
-
-    # Modify DEC and BNK columns
-    t1_data['DEC: Deceased (Y/N)'] = t1_data['DEC: Deceased (Y/N)'].replace({'N': '', 'Y': '1'})
-    t1_data['BNK: Bankrupt (Y/N)'] = t1_data['BNK: Bankrupt (Y/N)'].replace({'N': '', 'Y': '1'})
-
-    # Rename columns
-    columns_to_rename = {
-        'INPUT: First Name': 'First Name',
-        'INPUT: Last Name': 'Last Name',
-        'INPUT: Address 1': 'Mailing Address',
-        'INPUT: City': 'Mailing city',
-        'INPUT: State': 'Mailing state',
-        'INPUT: Zip Code': 'Mailing zip',
-        'INPUT: Extra 1': 'Property Address',
-        'INPUT: Extra 2': 'Property city',
-        'INPUT: Extra 3': 'Property State',
-        'INPUT: Extra 4': 'Property zip',
-        'BNK: Bankrupt (Y/N)': 'Bankrupcy',
-        'DEC: Deceased (Y/N)': 'Estate',
-        'ADD: Address1': 'Golden Address',
-        'ADD: Address1 City': 'Golden city',
-        'ADD: Address1 State': 'Golden State',
-        'ADD: Address1 Zip': 'Golden Zip'
-    }
-    
-    t1_data.rename(columns=columns_to_rename, inplace=True)
-
-    # Add ID column starting at 1 and incrementing by 1 for each row
-    t1_data.insert(0, 'ID', range(1, len(t1_data) + 1))
-
-    # Prepare the Litigator scrubbing file
-    phone_columns = [
-        'PH: Phone1', 'PH: Phone2', 'PH: Phone3', 'PH: Phone4', 'PH: Phone5',
-        'REL1: Phone 1', 'REL1: Phone 2', 'REL1: Phone 3',
-        'REL2: Phone 1', 'REL2: Phone 2', 'REL2: Phone 3',
-        'REL3: Phone 1', 'REL3: Phone 2', 'REL3: Phone 3'
-    ]
-    
-    litigator_data = t1_data[['ID'] + phone_columns]
-    litigator_data = litigator_data.set_index('ID')
-    litigator_data = litigator_data.stack().reset_index(name='Numbers').drop('level_1', axis=1)
-    litigator_data = litigator_data[litigator_data['Numbers'].notnull()]
+    with measure('before_t1', 'transform', 'stack phones') as values:
+        litigator_data = build_litigator_data(t1_data)
+        values['rows'] = len(litigator_data)
 
     # Save the modified T1Skiptrace file
-    t1_output_path = os.path.join(output_folder, f"modified_{os.path.basename(t1_file_path)}")
-    litigator_output_path = os.path.join(output_folder, "Litigator scrubbing.xlsx")
     try:
-        t1_data.to_excel(t1_output_path, index=False)
+        with measure('before_t1', 'write', os.path.basename(t1_output_path)):
+            write_excel(t1_data, t1_output_path)
         print(f"Modified file saved successfully at {t1_output_path}")
         # Save the Litigator scrubbing file
-        litigator_data.to_excel(litigator_output_path, index=False)
+        with measure('before_t1', 'write', os.path.basename(litigator_output_path)):
+            write_table(litigator_data, litigator_output_path)
         print(f"Litigator scrubbing file saved successfully at {litigator_output_path}")
     except Exception as e:
         print(f"Failed to save the modified files: {e}")
+    save_unmatched(unmatched, output_folder)
+
+    return t1_data, litigator_data
 
-# Uncomment the following line to run the function
-integrate_skiptrace_data()
+if __name__ == "__main__":
+    with run_report_from_env("t1 output"):
+        integrate_skiptrace_data()
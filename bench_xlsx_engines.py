@@ -0,0 +1,48 @@
+import os
+import time
+
+from synthetic import synthetic_t1_data
+from xlsx_io import module_available, pandas_version, read_excel, write_excel
+
+def available_engines():
+    readers = ['openpyxl']
+    if module_available('python_calamine') and pandas_version() >= (2, 2):
+        readers.append('calamine')
+    writers = ['openpyxl']
+    if module_available('xlsxwriter'):
+        writers.append('xlsxwriter')
+    return readers, writers
+
+def benchmark_engines(rows=100000, folder="benchmark"):
+    # Time every available writer and reader engine on the same synthetic workbook
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    data = synthetic_t1_data(rows)
+    readers, writers = available_engines()
+    results = []
+
+    for engine in writers:
+        path = os.path.join(folder, f"engines_{engine}.xlsx")
+        start = time.perf_counter()
+        write_excel(data, path, engine=engine)
+        results.append(('write', engine, time.perf_counter() - start))
+
+    path = os.path.join(folder, f"engines_{writers[-1]}.xlsx")
+    for engine in readers:
+        start = time.perf_counter()
+        read_excel(path, engine=engine)
+        results.append(('read', engine, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    read_excel(path, engine=readers[-1], usecols=['INPUT: First Name', 'PH: Phone1'])
+    results.append(('read 2 columns', readers[-1], time.perf_counter() - start))
+
+    print(f"xlsx engines on {rows} rows x {data.shape[1]} columns:")
+    for operation, engine, elapsed in results:
+        print(f"  {operation:<15} {engine:<11} {elapsed:8.2f}s")
+
+    return results
+
+if __name__ == "__main__":
+    benchmark_engines()
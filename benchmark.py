@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+# Batch sizes to benchmark and where the workbooks and results go
+SCALES = (1000, 10000, 100000)
+BENCHMARK_FOLDER = "benchmark"
+RESULTS_FILE = "results.json"
+
+def peak_rss_mb():
+    # Peak resident memory of the current process, None where it can't be measured
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+def bench_skiptrace():
+    from skiptrace import skiptrace_process
+    all_data = skiptrace_process()
+    return {'out': sum(len(data) for data in all_data.values())}
+
+def bench_before_t1():
+    from before_t1 import integrate_skiptrace_data
+    t1_data, litigator_data = integrate_skiptrace_data()
+    return {'in': len(t1_data), 'out': len(litigator_data)}
+
+def bench_after_t1():
+    from after_t1 import identify_litigators_and_create_reports
+    reports = identify_litigators_and_create_reports()
+    return {'in': len(reports['category']), 'out': len(reports['import_t1_skiptrace']), 'flagged': len(reports['flagged'])}
+
+stages = {
+    'skiptrace': bench_skiptrace,
+    'before_t1': bench_before_t1,
+    'after_t1': bench_after_t1,
+}
+
+def phase_breakdown(report_path, stage):
+    # Sum the read/transform/write time and the rows read from the stage's run report events
+    phases, rows_read = {}, 0
+    with open(report_path) as f:
+        for line in f:
+            event = json.loads(line)
+            if event.get('event') != 'phase' or event.get('stage') != stage:
+                continue
+            phases[event['phase']] = phases.get(event['phase'], 0.0) + event.get('seconds', 0.0)
+            if event['phase'] == 'read':
+                rows_read += event.get('rows') or 0
+    return phases, rows_read
+
+def run_stage(stage, folder):
+    # Runs the real stage function in a fresh process, from the workspace so its default folders,
+    # read cache, clean store and ledger are the workspace's own, and the peak memory is this stage's only
+    from instrumentation import run_report
+
+    os.chdir(folder)
+    report_path = f"run_report_{stage}.jsonl"
+    if os.path.exists(report_path):
+        os.remove(report_path)
+
+    start = time.perf_counter()
+    with run_report(report_path):
+        rows = stages[stage]()
+    wall_seconds = time.perf_counter() - start
+
+    phases, rows_read = phase_breakdown(report_path, stage)
+    return {
+        'stage': stage,
+        'wall_seconds': round(wall_seconds, 4),
+        'phases': {name: round(seconds, 4) for name, seconds in phases.items()},
+        'peak_rss_mb': peak_rss_mb(),
+        'rows': {'read': rows_read, **rows},
+    }
+
+def version_label():
+    # Label the run with the current commit so results of different versions can be compared
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+def run_benchmarks(scales=SCALES, folder=BENCHMARK_FOLDER, label=None, seed=0):
+    from synthetic import write_synthetic_workspace
+    from xlsx_io import read_engine, write_engine
+
+    run = {
+        'label': label or version_label(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'engines': {'read': read_engine(), 'write': write_engine()},
+        'results': [],
+    }
+    context = multiprocessing.get_context('spawn')
+
+    for rows in scales:
+        workspace = os.path.join(folder, f"scale_{rows}")
+        shutil.rmtree(workspace, ignore_errors=True)
+        start = time.perf_counter()
+        write_synthetic_workspace(workspace, rows, seed)
+        print(f"Generated {rows} row workbooks in {time.perf_counter() - start:.2f}s")
+
+        # The stages run one after another since each one reads the previous one's outputs
+        for stage in stages:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_stage, stage, workspace).result()
+            result['scale'] = rows
+            run['results'].append(result)
+            phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in result['phases'].items())
+            print(f"{rows:>8} rows {stage:<10} {result['wall_seconds']:8.2f}s ({phases}), peak RSS {result['peak_rss_mb']} MB")
+
+    # Append to the results file so runs of different versions sit side by side
+    results_path = os.path.join(folder, RESULTS_FILE)
+    runs = []
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            runs = json.load(f)
+    runs.append(run)
+    with open(results_path, 'w') as f:
+        json.dump(runs, f, indent=2)
+    print(f"Benchmark results saved at {results_path}")
+
+    return run
+
+if __name__ == "__main__":
+    # Optional batch sizes on the command line, e.g. "python benchmark.py 1000 1000000"
+    run_benchmarks([int(rows) for rows in sys.argv[1:]] or SCALES)
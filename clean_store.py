@@ -0,0 +1,109 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+import numpy as np
+
+from phones import normalize_phone_numbers
+from xlsx_cache import file_digest, read_excel_cached
+
+# Folder holding one sorted array of normalized numbers per all_clean content, and the file each source path was last synced with
+CLEAN_STORE_FOLDER = "clean store"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "store.lock"
+
+def numbers_path(digest, store_folder=CLEAN_STORE_FOLDER):
+    return os.path.join(store_folder, f"all_clean-{digest}.npy")
+
+def load_clean_numbers(digest, store_folder=CLEAN_STORE_FOLDER):
+    # Memory-map the sorted int64 array of one all_clean file, None when it was never ingested
+    path = numbers_path(digest, store_folder)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r')
+
+def load_manifest(store_folder=CLEAN_STORE_FOLDER):
+    manifest_path = os.path.join(store_folder, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {'sources': {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(manifest, store_folder=CLEAN_STORE_FOLDER):
+    manifest_path = os.path.join(store_folder, MANIFEST_FILE)
+    with open(f"{manifest_path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+def save_clean_numbers(numbers, digest, store_folder=CLEAN_STORE_FOLDER):
+    # Save the sorted unique numbers of one all_clean file and return how many there are
+    if not os.path.exists(store_folder):
+        os.makedirs(store_folder)
+
+    clean_numbers = np.unique(normalize_phone_numbers(numbers).dropna().to_numpy(dtype=np.int64))
+
+    path = numbers_path(digest, store_folder)
+    temp_path = os.path.join(store_folder, f"tmp_{digest}.npy")
+    np.save(temp_path, clean_numbers)
+    os.replace(temp_path, path)
+
+    return len(clean_numbers)
+
+@contextmanager
+def store_lock(store_folder=CLEAN_STORE_FOLDER, timeout=600):
+    # Lock file so concurrent batches don't overwrite each other's manifest updates
+    if not os.path.exists(store_folder):
+        os.makedirs(store_folder)
+    lock_path = os.path.join(store_folder, LOCK_FILE)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL))
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"The clean store is locked, remove {lock_path} if no other run is active.")
+            time.sleep(0.2)
+    try:
+        yield
+    finally:
+        os.remove(lock_path)
+
+def sync_clean_store(clean_file_path, store_folder=CLEAN_STORE_FOLDER):
+    # Look up against the numbers of this exact all_clean file, read only the first time its contents are seen.
+    # Numbers missing from it are not clean anymore, even if an earlier all_clean had them.
+    digest = file_digest(clean_file_path)
+    source = os.path.abspath(clean_file_path)
+    if load_manifest(store_folder)['sources'].get(source) == digest:
+        clean_numbers = load_clean_numbers(digest, store_folder)
+        if clean_numbers is not None:
+            return clean_numbers
+
+    with store_lock(store_folder):
+        manifest = load_manifest(store_folder)
+        if load_clean_numbers(digest, store_folder) is None:
+            clean_data = read_excel_cached(clean_file_path, usecols=['Numbers'])
+            count = save_clean_numbers(clean_data['Numbers'], digest, store_folder)
+            print(f"Saved {count} clean numbers to the clean store from {clean_file_path}")
+
+        # Replace the numbers of this source, the previous file's array goes once no other source uses it
+        previous = manifest['sources'].get(source)
+        manifest['sources'][source] = digest
+        save_manifest(manifest, store_folder)
+        if previous is not None and previous not in manifest['sources'].values():
+            try:
+                os.remove(numbers_path(previous, store_folder))
+            except OSError:
+                pass
+
+    return load_clean_numbers(digest, store_folder)
+
+def is_clean(numbers, clean_numbers):
+    # Vectorized membership test of normalized Int64 numbers against the sorted clean array
+    numbers = normalize_phone_numbers(numbers)
+    if len(clean_numbers) == 0:
+        return np.zeros(len(numbers), dtype=bool)
+
+    values = numbers.to_numpy(dtype=np.int64, na_value=-1)
+    positions = np.minimum(np.searchsorted(clean_numbers, values), len(clean_numbers) - 1)
+    return (np.asarray(clean_numbers)[positions] == values) & numbers.notna().to_numpy()
@@ -0,0 +1,182 @@
+import os
+import sys
+import argparse
+import importlib
+
+from instrumentation import PROFILE_ENV, REPORT_ENV, TRACEMALLOC_ENV, run_report_from_env
+
+# Library API: the stage functions are imported from their modules on first use,
+# so "import cli" and "python cli.py --help" don't load pandas or the Excel engines
+api_functions = {
+    'skiptrace_process': 'skiptrace',
+    'load_skiptrace_data': 'skiptrace',
+    'remove_campaign_duplicates': 'skiptrace',
+    'integrate_skiptrace_data': 'before_t1',
+    'prepare_t1_data': 'before_t1',
+    'identify_litigators_and_create_reports': 'after_t1',
+    'create_import_t1_skiptrace_file': 'after_t1',
+    'build_reports': 'after_t1',
+    'run_pipeline': 'pipeline',
+    'trace_skiptrace_output': 'trace_client',
+    'enqueue_discovered': 'batch_runner',
+    'run_queued_jobs': 'batch_runner',
+    'run_benchmarks': 'benchmark',
+    'rolling_stats': 'batch_stats',
+    'summary_stats': 'batch_stats',
+}
+
+def __getattr__(name):
+    if name in api_functions:
+        return getattr(importlib.import_module(api_functions[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + list(api_functions))
+
+def ledger_path(args):
+    # --no-ledger turns the incremental check off, like ledger_path=None from Python
+    if args.no_ledger:
+        return None
+    if args.ledger:
+        return args.ledger
+    from ledger import LEDGER_PATH
+    return LEDGER_PATH
+
+def stats_kwargs(args):
+    # --no-stats leaves the batch out of the statistics history, like stats_folder=None from Python
+    if args.no_stats:
+        return {'stats_folder': None}
+    return {} if args.stats_folder is None else {'stats_folder': args.stats_folder}
+
+def run_skiptrace(args):
+    with run_report_from_env(args.output):
+        __getattr__('skiptrace_process')(args.input, args.output, priority=args.priority, workers=args.workers, ledger_path=ledger_path(args),
+                                         similarity=args.similarity, within_file=args.within_file)
+
+def run_before_t1(args):
+    with run_report_from_env(args.output):
+        __getattr__('integrate_skiptrace_data')(args.input, args.output, chunk_size=args.chunk_size, litigator_format=args.litigator_format)
+
+def run_after_t1(args):
+    kwargs = {} if args.store is None else {'store_folder': args.store}
+    with run_report_from_env(args.results):
+        if args.import_only:
+            __getattr__('create_import_t1_skiptrace_file')(args.output, args.results, args.input, **kwargs)
+        else:
+            __getattr__('identify_litigators_and_create_reports')(args.input, args.output, args.results, ledger_path=ledger_path(args), **stats_kwargs(args), **kwargs)
+
+def run_whole_pipeline(args):
+    kwargs = {} if args.store is None else {'store_folder': args.store}
+    with run_report_from_env(args.results):
+        writes = __getattr__('run_pipeline')(args.input, args.output, args.t1_input, args.t1_output, args.results, campaign=args.campaign,
+                                             background_writes=args.background_writes, workers=args.workers, ledger_path=ledger_path(args), **stats_kwargs(args), **kwargs)
+        # Background writes are still running, wait for them so they're part of the report
+        if writes is not None:
+            writes.result()
+
+def run_trace(args):
+    with run_report_from_env(args.t1_input):
+        __getattr__('trace_skiptrace_output')(args.output, args.t1_input, args.vendor_url, batch_size=args.batch_size,
+                                              concurrency=args.concurrency, rate=args.rate, poll_interval=args.poll_interval, max_wait=args.max_wait)
+
+def run_benchmark(args):
+    from benchmark import SCALES
+    __getattr__('run_benchmarks')(args.rows or SCALES)
+
+def add_ledger_options(parser):
+    parser.add_argument('--ledger', help="path of the ledger database")
+    parser.add_argument('--no-ledger', action='store_true', help="don't skip or record already traced records")
+
+def add_stats_options(parser):
+    parser.add_argument('--stats-folder', help="folder of the batch statistics history")
+    parser.add_argument('--no-stats', action='store_true', help="don't add the batch to the statistics history")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Skiptrace workflow: run any stage, the whole pipeline or the helpers.")
+    parser.add_argument('--report', action='store_true', help="write run_report.jsonl next to the outputs")
+    parser.add_argument('--profile', action='store_true', help="also save a cProfile dump with the report")
+    parser.add_argument('--tracemalloc', action='store_true', help="also record Python allocations with the report")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    skiptrace = commands.add_parser('skiptrace', help="filter and dedup the Cold Calling/SMS exports")
+    skiptrace.add_argument('--input', default="input")
+    skiptrace.add_argument('--output', default="output")
+    skiptrace.add_argument('--priority', nargs='+', default=['Cold Calling', 'SMS'], help="campaigns in priority order")
+    skiptrace.add_argument('--workers', type=int, default=1)
+    skiptrace.add_argument('--similarity', type=float, default=1.0, help="street name similarity for fuzzy address matching, 1 for exact matching")
+    skiptrace.add_argument('--within-file', action='store_true', help="also dedup mailing addresses within each file")
+    add_ledger_options(skiptrace)
+    skiptrace.set_defaults(handler=run_skiptrace)
+
+    before_t1 = commands.add_parser('before-t1', help="attach the Folios to the T1Skiptrace results")
+    before_t1.add_argument('--input', default="t1 input")
+    before_t1.add_argument('--output', default="t1 output")
+    before_t1.add_argument('--chunk-size', type=int, help="stream the T1Skiptrace file in chunks of this many rows")
+    before_t1.add_argument('--litigator-format', choices=['xlsx', 'csv', 'parquet'], default='xlsx')
+    before_t1.set_defaults(handler=run_before_t1)
+
+    after_t1 = commands.add_parser('after-t1', help="flag litigators and create the reports")
+    after_t1.add_argument('--input', default="t1 input")
+    after_t1.add_argument('--output', default="t1 output")
+    after_t1.add_argument('--results', default="after t1 output")
+    after_t1.add_argument('--store', help="clean number store folder")
+    after_t1.add_argument('--import-only', action='store_true', help="only create Import_T1_Skiptrace.xlsx")
+    add_ledger_options(after_t1)
+    add_stats_options(after_t1)
+    after_t1.set_defaults(handler=run_after_t1)
+
+    pipeline = commands.add_parser('pipeline', help="run the three stages in one process")
+    pipeline.add_argument('--input', default="input")
+    pipeline.add_argument('--output', default="output")
+    pipeline.add_argument('--t1-input', default="t1 input")
+    pipeline.add_argument('--t1-output', default="t1 output")
+    pipeline.add_argument('--results', default="after t1 output")
+    pipeline.add_argument('--store', help="clean number store folder")
+    pipeline.add_argument('--campaign', help="campaign file the T1Skiptrace results belong to")
+    pipeline.add_argument('--workers', type=int, default=1)
+    pipeline.add_argument('--background-writes', action='store_true')
+    add_ledger_options(pipeline)
+    add_stats_options(pipeline)
+    pipeline.set_defaults(handler=run_whole_pipeline)
+
+    trace = commands.add_parser('trace', help="send the '- BST' files to the trace vendor")
+    trace.add_argument('--output', default="output")
+    trace.add_argument('--t1-input', default="t1 input")
+    trace.add_argument('--vendor-url', default="http://127.0.0.1:8765")
+    trace.add_argument('--batch-size', type=int, default=1000)
+    trace.add_argument('--concurrency', type=int, default=4)
+    trace.add_argument('--rate', type=float, default=10.0, help="requests per second")
+    trace.add_argument('--poll-interval', type=float, default=1.0)
+    trace.add_argument('--max-wait', type=float, default=3600, help="seconds to wait for a batch before failing it")
+    trace.set_defaults(handler=run_trace)
+
+    benchmark = commands.add_parser('benchmark', help="run the benchmarks on synthetic batches")
+    benchmark.add_argument('rows', type=int, nargs='*', help="batch sizes")
+    benchmark.set_defaults(handler=run_benchmark)
+
+    # These have their own options and are handed the rest of the command line
+    commands.add_parser('vendor', help="run the local stand-in trace vendor", add_help=False)
+    commands.add_parser('batch', help="queue and run T1 batches in isolated workspaces", add_help=False)
+    commands.add_parser('stats', help="query the rolling batch statistics", add_help=False)
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+
+    delegated = {'vendor': 'trace_vendor', 'batch': 'batch_runner', 'stats': 'batch_stats'}
+    if args.command in delegated:
+        return importlib.import_module(delegated[args.command]).main(rest)
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+
+    # The options only set the environment variables read by run_report_from_env, so worker processes see them too
+    for flag, variable in ((args.report, REPORT_ENV), (args.profile, PROFILE_ENV), (args.tracemalloc, TRACEMALLOC_ENV)):
+        if flag:
+            os.environ[variable] = "1"
+    args.handler(args)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
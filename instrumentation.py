@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+# Report of the run in progress, None when instrumentation is off so the timers cost nothing
+active_report = None
+
+# Environment variables turning the instrumentation on when the scripts are run directly
+REPORT_ENV = "SKIPTRACE_REPORT"
+PROFILE_ENV = "SKIPTRACE_PROFILE"
+TRACEMALLOC_ENV = "SKIPTRACE_TRACEMALLOC"
+
+def current_rss_mb():
+    # Current resident memory, from psutil when installed or /proc on Linux
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class RunReport:
+    def __init__(self, report_path, profile=False, trace_memory=False):
+        self.report_path = report_path
+        self.trace_memory = trace_memory
+        self.profiler = cProfile.Profile() if profile else None
+        self.totals = {}
+        self.started = time.perf_counter()
+
+    def add(self, event):
+        # Events are appended as they happen so a long run can be inspected before it ends
+        event = {'time': datetime.now(timezone.utc).isoformat(timespec='seconds'), **event}
+        with open(self.report_path, 'a') as f:
+            f.write(json.dumps(event, default=str) + '\n')
+
+        # Only phase events count towards the per-phase totals, not the run start and end
+        if event.get('event') == 'phase':
+            key = f"{event['stage']}.{event['phase']}"
+            self.totals[key] = self.totals.get(key, 0.0) + event.get('seconds', 0.0)
+
+    def start(self):
+        self.add({'event': 'run_start', 'argv': sys.argv, 'pid': os.getpid(), 'rss_mb': current_rss_mb()})
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def finish(self):
+        base_path = os.path.splitext(self.report_path)[0]
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(f"{base_path}.prof")
+
+        summary = {
+            'event': 'run_end',
+            'seconds': round(time.perf_counter() - self.started, 4),
+            'rss_mb': current_rss_mb(),
+            'phase_totals': {key: round(seconds, 4) for key, seconds in self.totals.items()},
+        }
+        if self.trace_memory:
+            summary['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            with open(f"{base_path}.tracemalloc.txt", 'w') as f:
+                for stat in tracemalloc.take_snapshot().statistics('lineno')[:50]:
+                    f.write(f"{stat}\n")
+            tracemalloc.stop()
+        self.add(summary)
+
+@contextmanager
+def run_report(report_path, profile=False, trace_memory=False):
+    # Instrument everything run inside the block, writing JSONL events to report_path
+    global active_report
+    folder = os.path.dirname(report_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    previous, active_report = active_report, RunReport(report_path, profile, trace_memory)
+    active_report.start()
+    try:
+        yield active_report
+    finally:
+        active_report.finish()
+        active_report = previous
+
+def run_report_from_env(output_folder):
+    # Used by the scripts' __main__ blocks: SKIPTRACE_REPORT=1 writes run_report.jsonl next to the outputs
+    if not os.environ.get(REPORT_ENV):
+        return nullcontext()
+    return run_report(
+        os.path.join(output_folder, "run_report.jsonl"),
+        profile=bool(os.environ.get(PROFILE_ENV)),
+        trace_memory=bool(os.environ.get(TRACEMALLOC_ENV)),
+    )
+
+def record(stage, phase, name=None, **values):
+    # Add an event measured elsewhere, e.g. in a worker process
+    if active_report is not None:
+        active_report.add({'event': 'phase', 'stage': stage, 'phase': phase, 'name': name, **values})
+
+@contextmanager
+def measure(stage, phase, name=None):
+    # Time a read/transform/write phase, the caller can add e.g. rows to the yielded dict
+    values = {}
+    report = active_report
+    if report is None:
+        yield values
+        return
+
+    start = time.perf_counter()
+    rss_before = current_rss_mb()
+    if report.trace_memory:
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    status = 'ok'
+    try:
+        yield values
+    except BaseException as e:
+        status = 'error'
+        values['error'] = repr(e)
+        raise
+    finally:
+        rss_after = current_rss_mb()
+        event = {
+            'event': 'phase', 'stage': stage, 'phase': phase, 'name': name, 'status': status,
+            'seconds': round(time.perf_counter() - start, 4),
+            'rss_delta_mb': None if rss_before is None or rss_after is None else round(rss_after - rss_before, 2),
+            **values,
+        }
+        if report.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            event['traced_delta_mb'] = round((current - traced_before) / 1024 ** 2, 2)
+            event['traced_peak_mb'] = round(peak / 1024 ** 2, 2)
+        report.add(event)
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+
+from addresses import mailing_address_keys
+
+# SQLite file recording when each Folio was sent to the trace vendor and what came back
+LEDGER_PATH = os.path.join("ledger", "skiptrace_ledger.db")
+
+# Records sent longer ago than this are considered stale and exported again
+STALE_AFTER_DAYS = 180
+
+@contextmanager
+def ledger_connection(ledger_path=LEDGER_PATH):
+    # Commit on success and always close the connection
+    connection = connect_ledger(ledger_path)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+def connect_ledger(ledger_path=LEDGER_PATH):
+    folder = os.path.dirname(ledger_path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    # Concurrent batches share the ledger, so wait for locks instead of failing right away
+    connection = sqlite3.connect(ledger_path, timeout=60)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS ledger (
+            folio TEXT PRIMARY KEY,
+            mailing_key TEXT,
+            sent_at TEXT,
+            traced_at TEXT,
+            outcome TEXT
+        )
+    """)
+    connection.execute("CREATE INDEX IF NOT EXISTS ledger_mailing_key ON ledger (mailing_key)")
+    return connection
+
+def folio_keys(folios):
+    # Folios read from Excel may come back as numbers, so compare them as text without a trailing ".0"
+    return pd.Series(folios).astype('string').str.strip().str.replace(r'\.0$', '', regex=True)
+
+def now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def load_ledger(ledger_path=LEDGER_PATH):
+    with ledger_connection(ledger_path) as connection:
+        return pd.read_sql("SELECT folio, mailing_key, sent_at, traced_at, outcome FROM ledger", connection)
+
+def exclude_traced_records(data, ledger_path=LEDGER_PATH, stale_after_days=STALE_AFTER_DAYS):
+    # Anti-join the records against the ones sent within the stale window, by Folio or mailing address
+    ledger = load_ledger(ledger_path)
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=stale_after_days)).isoformat(timespec='seconds')
+    recent = ledger[ledger['sent_at'] >= cutoff]
+
+    already_traced = folio_keys(data['Folio']).isin(recent['folio']).to_numpy()
+    mailing_keys = mailing_address_keys(data['MailingAddress'], data['MailingZip'])
+    already_traced = already_traced | (mailing_keys.notna() & mailing_keys.isin(recent['mailing_key'].dropna())).to_numpy()
+
+    return data[~already_traced], int(already_traced.sum())
+
+def record_sent(data, ledger_path=LEDGER_PATH):
+    # Mark the exported records as sent, resetting any previous outcome
+    records = pd.DataFrame({
+        'folio': folio_keys(data['Folio']),
+        'mailing_key': mailing_address_keys(data['MailingAddress'], data['MailingZip']),
+    }).dropna(subset=['folio'])
+    sent_at = now()
+
+    with ledger_connection(ledger_path) as connection:
+        connection.executemany("""
+            INSERT INTO ledger (folio, mailing_key, sent_at, traced_at, outcome) VALUES (?, ?, ?, NULL, 'sent')
+            ON CONFLICT (folio) DO UPDATE SET
+                mailing_key = excluded.mailing_key, sent_at = excluded.sent_at, traced_at = NULL, outcome = 'sent'
+        """, [(folio, None if pd.isna(key) else key, sent_at) for folio, key in records.itertuples(index=False)])
+    return len(records)
+
+def record_outcomes(folios, outcome, ledger_path=LEDGER_PATH):
+    # Store the trace outcome ('hit', 'non-hit' or 'litigator') of each Folio
+    folios = folio_keys(folios).dropna().unique()
+    traced_at = now()
+
+    with ledger_connection(ledger_path) as connection:
+        connection.executemany("""
+            INSERT INTO ledger (folio, sent_at, traced_at, outcome) VALUES (?, ?, ?, ?)
+            ON CONFLICT (folio) DO UPDATE SET traced_at = excluded.traced_at, outcome = excluded.outcome
+        """, [(folio, traced_at, traced_at, outcome) for folio in folios])
+    return len(folios)
@@ -0,0 +1,37 @@
+import pandas as pd
+
+# Phone columns returned by the T1Skiptrace vendor
+phone_columns = [
+    'PH: Phone1', 'PH: Phone2', 'PH: Phone3', 'PH: Phone4', 'PH: Phone5',
+    'REL1: Phone 1', 'REL1: Phone 2', 'REL1: Phone 3',
+    'REL2: Phone 1', 'REL2: Phone 2', 'REL2: Phone 3',
+    'REL3: Phone 1', 'REL3: Phone 2', 'REL3: Phone 3'
+]
+
+def normalize_phone_numbers(values):
+    # Convert raw phone cells ("(305) 555-1234", "3055551234", 3055551234.0) to nullable Int64 10-digit keys
+    values = pd.Series(values)
+    if values.dtype == 'Int64':
+        return values
+
+    # Numeric cells are converted directly so floats don't leave a trailing ".0" digit behind
+    numeric = pd.to_numeric(values, errors='coerce')
+    numeric = numeric.where(numeric.abs() < 1e11)
+    numeric_text = numeric.round().astype('Int64').astype('string')
+
+    # Keep only the digits of the text cells
+    digits = values.astype('string').str.replace(r'\D', '', regex=True)
+    digits = digits.where(numeric.isna(), numeric_text)
+
+    # Drop the leading US country code and keep only complete 10-digit numbers
+    digits = digits.where(~((digits.str.len() == 11) & digits.str.startswith('1')), digits.str[1:])
+    digits = digits.where(digits.str.len() == 10)
+
+    return pd.to_numeric(digits, errors='coerce').astype('Int64')
+
+def normalize_phone_columns(data, columns=phone_columns):
+    # Normalize every phone column present in the frame, leaving the other columns untouched
+    columns = [col for col in columns if col in data.columns]
+    if not columns:
+        return data
+    return data.assign(**{col: normalize_phone_numbers(data[col]) for col in columns})
@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from skiptrace import load_skiptrace_data, skiptrace_output_name
+from batch_files import pair_batches
+from before_t1 import build_litigator_data, campaign_join_usecols, prepare_t1_data, report_unmatched
+from after_t1 import find_file, build_reports, record_report_outcomes, report_files
+from batch_stats import STATS_FOLDER, append_batch_stats, batch_label
+from clean_store import CLEAN_STORE_FOLDER, sync_clean_store
+from instrumentation import measure, run_report_from_env
+from ledger import LEDGER_PATH, record_sent
+from schema import apply_schema
+from xlsx_cache import read_excel_cached
+from xlsx_io import write_excel
+
+def write_artifacts(artifacts, background=False):
+    # Write each (path, frame[, after_write]) entry to xlsx, optionally on a background thread.
+    # after_write only runs once its file is saved, like the ledger update in skiptrace.py
+    def write_all():
+        for output_path, data, *after_write in artifacts:
+            try:
+                with measure('pipeline', 'write', os.path.basename(output_path)) as values:
+                    values['rows'] = len(data)
+                    write_excel(data, output_path)
+                print(f"Output file created at {output_path}")
+            except Exception as e:
+                print(f"Failed to save the output file {output_path}: {e}")
+                continue
+            for callback in after_write:
+                callback()
+
+    if not background:
+        write_all()
+        return None
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(write_all)
+    executor.shutdown(wait=False)
+    return future
+
+def pick_campaign(all_data, t1_file_name, campaign=None):
+    # Use the requested campaign, or the one named in the T1 file, or the first one found
+    if campaign is not None:
+        return campaign if campaign in all_data else None
+    for file_name in all_data:
+        if file_name.replace('.xlsx', '') in t1_file_name:
+            return file_name
+    return next(iter(all_data), None)
+
+def run_pipeline(input_folder="input", output_folder="output", t1_input_folder="t1 input",
+                 t1_output_folder="t1 output", result_folder="after t1 output",
+                 store_folder=CLEAN_STORE_FOLDER, campaign=None, background_writes=False,
+                 workers=1, ledger_path=LEDGER_PATH, stats_folder=STATS_FOLDER):
+    # Ensure all necessary directories exist
+    for folder in (output_folder, t1_output_folder, result_folder):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    artifacts = []
+
+    # Stage 1: filter and dedup the campaign exports
+    with measure('pipeline', 'stage', 'skiptrace'):
+        all_data = load_skiptrace_data(input_folder, workers=workers, ledger_path=ledger_path)
+    if all_data is None:
+        return None
+    for file_name, data in all_data.items():
+        print(f"Total properties processed for {file_name}: {data.shape[0]}")
+        output_path = os.path.join(output_folder, skiptrace_output_name(file_name))
+        if ledger_path is None:
+            artifacts.append((output_path, data))
+        else:
+            # The records are only marked as sent once their BST file is saved
+            artifacts.append((output_path, data, lambda data=data: record_sent(data, ledger_path)))
+
+    # The vendor results may not be available yet, in which case only stage 1 is emitted
+    t1_file_path = find_file(t1_input_folder, "T1Skiptrace BST_out")
+    if t1_file_path is None:
+        print("No T1Skiptrace BST_out file found, only the BST files will be created.")
+        return write_artifacts(artifacts, background_writes)
+
+    # The vendor traced the BST file that was sent, so use it when it was dropped in "t1 input", paired by name.
+    # Otherwise the records exported by this run are used, the ledger would exclude last run's ones.
+    pairs = pair_batches(t1_input_folder, report_unpaired=False)
+    if len(pairs) > 1:
+        print(f"Found {len(pairs)} T1Skiptrace batches, only {pairs[0][0]} is processed. Use batch_runner.py to process several batches.")
+    calling_sms_file_path = None
+    if pairs:
+        t1_file_path, calling_sms_file_path = (os.path.join(t1_input_folder, f) for f in pairs[0])
+    if calling_sms_file_path is None:
+        campaign = pick_campaign(all_data, os.path.basename(t1_file_path), campaign)
+        if campaign is None:
+            print("No Cold Calling or SMS data available to match the T1Skiptrace BST_out file.")
+            return write_artifacts(artifacts, background_writes)
+
+    clean_file_path = find_file(t1_input_folder, "all_clean")
+    if clean_file_path is None:
+        print("No 'all_clean' found in the input folder.")
+        return write_artifacts(artifacts, background_writes)
+
+    try:
+        with measure('pipeline', 'read', os.path.basename(t1_file_path)):
+            t1_data = apply_schema(read_excel_cached(t1_file_path))
+        if calling_sms_file_path is None:
+            campaign_data = all_data[campaign]
+        else:
+            with measure('pipeline', 'read', os.path.basename(calling_sms_file_path)):
+                campaign_data = read_excel_cached(calling_sms_file_path, usecols=campaign_join_usecols)
+        with measure('pipeline', 'read', os.path.basename(clean_file_path)):
+            clean_numbers = sync_clean_store(clean_file_path, store_folder)
+    except Exception as e:
+        print(f"Failed to read the files: {e}")
+        return write_artifacts(artifacts, background_writes)
+
+    # Stage 2: attach the campaign rows to the vendor results and build the scrubbing list
+    with measure('pipeline', 'transform', 'before_t1'):
+        t1_data, unmatched = prepare_t1_data(t1_data, campaign_data)
+        litigator_data = None if t1_data is None else build_litigator_data(t1_data)
+    if t1_data is None:
+        return write_artifacts(artifacts, background_writes)
+    artifacts.append((os.path.join(t1_output_folder, f"modified_{os.path.basename(t1_file_path)}"), t1_data))
+    artifacts.append((os.path.join(t1_output_folder, "Litigator scrubbing.xlsx"), litigator_data))
+    if unmatched is not None and not unmatched.empty:
+        report_unmatched(unmatched)
+        artifacts.append((os.path.join(t1_output_folder, "Unmatched records.xlsx"), unmatched))
+
+    # Stage 3: flag litigators and build the import files
+    with measure('pipeline', 'transform', 'after_t1'):
+        reports = build_reports(t1_data, litigator_data, clean_numbers)
+    if ledger_path is not None:
+        record_report_outcomes(t1_data, reports['category'], ledger_path)
+    if stats_folder is not None:
+        campaign_file_name = campaign if calling_sms_file_path is None else os.path.basename(calling_sms_file_path)
+        append_batch_stats(reports['stats'], batch_label(os.path.basename(t1_file_path), campaign_file_name), stats_folder)
+    for report, file_name, _ in report_files:
+        artifacts.append((os.path.join(result_folder, file_name), reports[report]))
+
+    return write_artifacts(artifacts, background_writes)
+
+if __name__ == "__main__":
+    with run_report_from_env("after t1 output"):
+        run_pipeline()
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from xlsx_io import module_available
+
+# Low-cardinality columns stored as categoricals: states, phone types, Y/N flags and constant tags
+category_columns = [
+    'STATE', 'MAILING STATE', 'PropertyState', 'MailingState',
+    'INPUT: State', 'INPUT: Extra 3', 'ADD: Address1 State',
+    'Mailing state', 'Property State', 'Golden State',
+    'PH: Phone1 Type', 'PH: Phone2 Type', 'PH: Phone3 Type', 'PH: Phone4 Type', 'PH: Phone5 Type',
+    'DEC: Deceased (Y/N)', 'BNK: Bankrupt (Y/N)', 'Estate', 'Bankrupcy',
+    'Property Skip Trace', 'Number Source', 'Phone number skip trace', 'TAG', 'Note', 'Action Plan',
+]
+
+# Zip codes stored as nullable integers when every value is a plain zip without a leading zero
+int_columns = [
+    'ZIP', 'MAILING ZIP', 'PropertyZip', 'MailingZip',
+    'INPUT: Zip Code', 'INPUT: Extra 4', 'ADD: Address1 Zip',
+    'Mailing zip', 'Property zip', 'Golden Zip',
+]
+
+# Names, addresses and cities stored as Arrow-backed strings when pyarrow is installed
+string_columns = [
+    'OWNER FULL NAME', 'OWNER FIRST NAME', 'OWNER LAST NAME', 'ADDRESS', 'CITY', 'MAILING ADDRESS', 'MAILING CITY', 'TAGS',
+    'OwnerFullName', 'OwnerFirstName', 'OwnerLastName', 'PropertyAddress', 'PropertyCity', 'MailingAddress', 'MailingCity',
+    'INPUT: First Name', 'INPUT: Last Name', 'INPUT: Address 1', 'INPUT: City', 'INPUT: Extra 1', 'INPUT: Extra 2',
+    'ADD: Address1', 'ADD: Address1 City',
+    'First Name', 'Last Name', 'Mailing Address', 'Mailing city', 'Property Address', 'Property city',
+    'Golden Address', 'Golden city',
+    'EMAIL: Email1', 'EMAIL: Email2', 'EMAIL: Email3', 'EMAIL: Email4', 'EMAIL: Email5',
+]
+
+def string_dtype():
+    return pd.StringDtype('pyarrow') if module_available('pyarrow') else pd.StringDtype()
+
+def to_nullable_int(values):
+    # Only convert when nothing is lost, e.g. ZIP+4 values like "33101-1234" and zips stored as text
+    # with a leading zero like "02134" keep the column as text
+    if not pd.api.types.is_numeric_dtype(values) and values.dropna().astype('string').str.strip().str.startswith('0').any():
+        return values.astype(string_dtype())
+    numeric = pd.to_numeric(values, errors='coerce')
+    if numeric.notna().sum() != values.notna().sum() or (numeric.dropna() % 1 != 0).any():
+        return values.astype(string_dtype())
+    return numeric.astype('Int64')
+
+def apply_schema(data):
+    # Convert the declared columns present in the frame, other columns are left as they are
+    strings = string_dtype()
+    converted = {}
+    for col in data.columns:
+        if col in category_columns and not isinstance(data[col].dtype, pd.CategoricalDtype):
+            converted[col] = data[col].astype('category')
+        elif col in int_columns and data[col].dtype != 'Int64':
+            converted[col] = to_nullable_int(data[col])
+        elif col in string_columns and data[col].dtype != strings:
+            converted[col] = data[col].astype(strings)
+    return data.assign(**converted) if converted else data
@@ -1,96 +1,200 @@
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
-def skiptrace_process(input_folder="input", output_folder="output"):
-    # Create the output directory if it doesn't exist
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-    
+from addresses import DEDUP_SIMILARITY, address_clusters
+from instrumentation import measure, record, run_report_from_env
+from ledger import LEDGER_PATH, STALE_AFTER_DAYS, exclude_traced_records, record_sent
+from schema import apply_schema
+from xlsx_cache import read_excel_cached
+from xlsx_io import write_excel
+
+# Columns to be processed with new names and the desired order
+desired_columns = {
+    'FOLIO': 'Folio', 'OWNER FULL NAME': 'OwnerFullName', 'OWNER FIRST NAME': 'OwnerFirstName', 
+    'OWNER LAST NAME': 'OwnerLastName', 'ADDRESS': 'PropertyAddress', 'CITY': 'PropertyCity', 
+    'STATE': 'PropertyState', 'ZIP': 'PropertyZip', 'MAILING ADDRESS': 'MailingAddress', 
+    'MAILING CITY': 'MailingCity', 'MAILING STATE': 'MailingState', 'MAILING ZIP': 'MailingZip'
+}
+
+column_order = [
+    'Folio', 'OwnerFullName', 'OwnerFirstName', 'OwnerLastName',
+    'MailingAddress', 'MailingCity', 'MailingState', 'MailingZip',
+    'PropertyAddress', 'PropertyCity', 'PropertyState', 'PropertyZip'
+]
+
+def campaign_usecols(column):
+    # Only the TAGS, phone number and desired columns are needed from the campaign exports
+    return isinstance(column, str) and (column == 'TAGS' or 'PHONE NUMBER' in column or column in desired_columns)
+
+def filter_skiptrace_data(data):
+    # Check if 'TAGS' column exists, the file can't be processed otherwise
+    if 'TAGS' not in data.columns:
+        return None
+
+    # Define the phone number columns dynamically based on the data frame
+    phone_columns = [col for col in data.columns if 'PHONE NUMBER' in col]
+
+    # Filter the data for rows where "TAGS" does NOT contain "Skiptrace" and all phone numbers are empty
+    condition_no_skiptrace = ~data['TAGS'].str.contains('Skiptrace', na=False)
+    condition_no_phones = data[phone_columns].isnull().all(axis=1) if phone_columns else True
+    filtered_data = data[condition_no_skiptrace & condition_no_phones]
+
+    # Rename and keep only the desired columns if they exist in the filtered data
+    filtered_data = filtered_data.rename(columns=desired_columns)
+    filtered_data = filtered_data[[new_col for new_col in column_order if new_col in filtered_data.columns]]
+
+    # Ensure the columns are in the desired order
+    return filtered_data.reindex(columns=column_order)
+
+# Campaigns in priority order, a record kept by an earlier campaign is removed from the later ones
+campaign_priority = ['Cold Calling', 'SMS']
+
+def campaign_rank(file_name, priority=campaign_priority):
+    # Rank a file by the first campaign name it contains, unknown campaigns go last
+    return next((i for i, name in enumerate(priority) if name in file_name), len(priority))
+
+def remove_campaign_duplicates(all_data, priority=campaign_priority, similarity=DEDUP_SIMILARITY, within_file=False):
+    # Eliminate duplicates between campaigns based on mailing criteria, keeping the higher priority campaign
+    file_names = sorted(all_data, key=lambda f: (campaign_rank(f, priority), f))
+    if not file_names:
+        return all_data
+
+    # Cluster the mailing addresses of all campaigns at once, in priority order
+    mailing = pd.concat([all_data[f][['MailingAddress', 'MailingZip']] for f in file_names], ignore_index=True)
+    clusters = address_clusters(mailing['MailingAddress'], mailing['MailingZip'], similarity)
+    sources = np.repeat(np.arange(len(file_names)), [len(all_data[f]) for f in file_names])
+    rows = np.arange(len(clusters))
+
+    # The first row of each cluster is kept, every other row of the cluster is a duplicate of it
+    first_rows = pd.Series(rows).groupby(clusters).transform('first').to_numpy()
+    matchable = clusters >= 0
+    kept_by = sources[first_rows]
+
+    for i, file_name in enumerate(file_names):
+        in_file = sources == i
+        keep = np.ones(in_file.sum(), dtype=bool)
+
+        # Anti-join against every higher priority campaign, counting the duplicates per pair
+        for j, kept_name in enumerate(file_names[:i]):
+            duplicates = (matchable & (kept_by == j))[in_file]
+            keep &= ~duplicates
+            if duplicates.any():
+                print(f"Removed {duplicates.sum()} duplicate entries from {file_name} matching {kept_name} based on mailing criteria.")
+
+        if within_file:
+            duplicates = (matchable & (kept_by == i) & (first_rows != rows))[in_file]
+            keep &= ~duplicates
+            if duplicates.any():
+                print(f"Removed {duplicates.sum()} duplicate entries within {file_name} based on mailing criteria.")
+
+        all_data[file_name] = all_data[file_name][keep]
+
+    return all_data
+
+def read_campaign_file(input_path):
+    # Read and filter one workbook, returning (filtered data, error message, timings)
+    start = time.perf_counter()
+    input_file = os.path.basename(input_path)
+    timings = {}
+
+    # Read the Excel file
+    try:
+        data = apply_schema(read_excel_cached(input_path, usecols=campaign_usecols))
+    except Exception as e:
+        timings['read'] = time.perf_counter() - start
+        return None, f"An error occurred when reading the Excel file {input_file}: {e}", timings
+    timings['read'] = time.perf_counter() - start
+    timings['rows'] = len(data)
+
+    filtered_data = filter_skiptrace_data(data)
+    timings['transform'] = time.perf_counter() - start - timings['read']
+    if filtered_data is None:
+        return None, f"The column 'TAGS' is missing in {input_file}, skipping this file.", timings
+
+    return filtered_data, None, timings
+
+def exclude_ledger_records(all_data, ledger_path=LEDGER_PATH, stale_after_days=STALE_AFTER_DAYS):
+    # Skip the records already sent to the vendor within the stale window
+    for file_name, data in all_data.items():
+        all_data[file_name], excluded = exclude_traced_records(data, ledger_path, stale_after_days)
+        if excluded:
+            print(f"Skipped {excluded} entries from {file_name} already sent for tracing in the last {stale_after_days} days.")
+    return all_data
+
+def load_skiptrace_data(input_folder="input", priority=campaign_priority, workers=1, ledger_path=LEDGER_PATH, similarity=DEDUP_SIMILARITY, within_file=False):
     # List all Excel files that contain "SMS" or "Cold Calling" in their names
     input_files = [f for f in os.listdir(input_folder) if f.endswith('.xlsx') and ('SMS' in f or 'Cold Calling' in f)]
     if not input_files:
         print("No relevant Excel files found in the input folder.")
-        return
-
-    all_data = {}
-
-    # Columns to be processed with new names and the desired order
-    desired_columns = {
-        'FOLIO': 'Folio', 'OWNER FULL NAME': 'OwnerFullName', 'OWNER FIRST NAME': 'OwnerFirstName', 
-        'OWNER LAST NAME': 'OwnerLastName', 'ADDRESS': 'PropertyAddress', 'CITY': 'PropertyCity', 
-        'STATE': 'PropertyState', 'ZIP': 'PropertyZip', 'MAILING ADDRESS': 'MailingAddress', 
-        'MAILING CITY': 'MailingCity', 'MAILING STATE': 'MailingState', 'MAILING ZIP': 'MailingZip'
-    }
-    
-    column_order = [
-        'Folio', 'OwnerFullName', 'OwnerFirstName', 'OwnerLastName',
-        'MailingAddress', 'MailingCity', 'MailingState', 'MailingZip',
-        'PropertyAddress', 'PropertyCity', 'PropertyState', 'PropertyZip'
-    ]
-
-    # Process each file
-    for input_file in input_files:
-        input_path = os.path.join(input_folder, input_file)
-        
-        # Read the Excel file
-        try:
-            data = pd.read_excel(input_path)
-        except Exception as e:
-            print(f"An error occurred when reading the Excel file {input_file}: {e}")
-            continue
-
-        # Check if 'TAGS' column exists and process accordingly
-        if 'TAGS' in data.columns:
-            # Define the phone number columns dynamically based on the data frame
-            phone_columns = [col for col in data.columns if 'PHONE NUMBER' in col]
+        return None
 
-            # Filter the data for rows where "TAGS" does NOT contain "Skiptrace" and all phone numbers are empty
-            condition_no_skiptrace = ~data['TAGS'].str.contains('Skiptrace', na=False)
-            condition_no_phones = data[phone_columns].isnull().all(axis=1) if phone_columns else True
-            filtered_data = data[condition_no_skiptrace & condition_no_phones]
+    input_paths = [os.path.join(input_folder, input_file) for input_file in input_files]
 
-            # Rename and keep only the desired columns if they exist in the filtered data
-            filtered_data = filtered_data.rename(columns=desired_columns)
-            filtered_data = filtered_data[[new_col for new_col in column_order if new_col in filtered_data.columns]]
+    # Parse and filter the files in worker processes when more than one worker is requested
+    if workers > 1 and len(input_paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(read_campaign_file, input_paths))
+    else:
+        results = [read_campaign_file(input_path) for input_path in input_paths]
 
-            # Ensure the columns are in the desired order
-            filtered_data = filtered_data.reindex(columns=column_order)
+    all_data = {}
 
-            # Store data in dictionary for later use
-            all_data[input_file] = filtered_data
-        else:
-            print(f"The column 'TAGS' is missing in {input_file}, skipping this file.")
+    # Store each filtered dataset in a dictionary for the dedup step
+    for input_file, (filtered_data, error, timings) in zip(input_files, results):
+        # The files may have been read in worker processes, so their timings are recorded here
+        record('skiptrace', 'read', input_file, seconds=round(timings['read'], 4), rows=timings.get('rows'), status='ok' if 'rows' in timings else 'error')
+        if error is not None:
+            print(error)
+            continue
+        record('skiptrace', 'transform', f"filter {input_file}", seconds=round(timings['transform'], 4), rows=filtered_data.shape[0])
+        print(f"Read {input_file} in {timings['read'] + timings['transform']:.2f}s ({filtered_data.shape[0]} properties to trace)")
+        all_data[input_file] = filtered_data
 
-    # Eliminate duplicates between SMS and Cold Calling based on mailing criteria
-    if 'SMS.xlsx' in all_data and 'Cold Calling.xlsx' in all_data:
-        sms_data = all_data['SMS.xlsx']
-        cold_calling_data = all_data['Cold Calling.xlsx']
+    with measure('skiptrace', 'transform', 'dedup') as values:
+        all_data = remove_campaign_duplicates(all_data, priority, similarity, within_file)
+        values['rows'] = sum(len(data) for data in all_data.values())
 
-        # Create combined criteria for MAILING ADDRESS + MAILING ZIP
-        duplicate_criteria = ['MailingAddress', 'MailingZip']
+    # A ledger_path of None disables the incremental check
+    if ledger_path is not None:
+        with measure('skiptrace', 'transform', 'ledger') as values:
+            all_data = exclude_ledger_records(all_data, ledger_path)
+            values['rows'] = sum(len(data) for data in all_data.values())
 
-        # Identify duplicates based on MAILING ADDRESS + MAILING ZIP
-        cold_calling_duplicates = cold_calling_data[duplicate_criteria]
-        sms_duplicates = sms_data[sms_data[duplicate_criteria].isin(cold_calling_duplicates.to_dict('list')).all(axis=1)]
+    return all_data
 
-        # Remove identified duplicates from SMS data
-        sms_data = sms_data[~sms_data.index.isin(sms_duplicates.index)]
+def skiptrace_output_name(file_name):
+    # Append 'BST' before the file extension
+    return file_name.replace('.xlsx', ' - BST.xlsx')
 
-        # Update the SMS data after removing duplicates
-        all_data['SMS.xlsx'] = sms_data
+def skiptrace_process(input_folder="input", output_folder="output", priority=campaign_priority, workers=1, ledger_path=LEDGER_PATH, similarity=DEDUP_SIMILARITY, within_file=False):
+    # Create the output directory if it doesn't exist
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
 
-        print(f"Removed {len(sms_duplicates)} duplicate entries from SMS based on mailing criteria.")
+    all_data = load_skiptrace_data(input_folder, priority, workers, ledger_path, similarity, within_file)
+    if all_data is None:
+        return
 
     # Save each filtered dataset to an Excel file in the output folder and print count
     for file_name, data in all_data.items():
-        output_file_name = file_name.replace('.xlsx', ' - BST.xlsx')  # Append 'BST' before the file extension
+        output_file_name = skiptrace_output_name(file_name)
         output_path = os.path.join(output_folder, output_file_name)
         try:
-            data.to_excel(output_path, index=False)
+            with measure('skiptrace', 'write', output_file_name) as values:
+                values['rows'] = data.shape[0]
+                write_excel(data, output_path)
             print(f"Output file created at {output_path}")
             print(f"Total properties processed for {file_name}: {data.shape[0]}")
+            if ledger_path is not None:
+                record_sent(data, ledger_path)
         except Exception as e:
             print(f"Failed to save the output file {output_file_name}: {e}")
 
-# Uncomment the following line to run the function
-skiptrace_process()
+    return all_data
+
+if __name__ == "__main__":
+    with run_report_from_env("output"):
+        skiptrace_process()
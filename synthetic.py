@@ -0,0 +1,118 @@
+import os
+import numpy as np
+import pandas as pd
+
+from phones import phone_columns
+from skiptrace import column_order, desired_columns
+from xlsx_io import write_excel
+
+first_names = ['JOHN', 'MARIA', 'JOSE', 'LINDA', 'ROBERT', 'ANA', 'MICHAEL', 'CARMEN']
+last_names = ['SMITH', 'GARCIA', 'JOHNSON', 'LOPEZ', 'BROWN', 'RODRIGUEZ', 'PEREZ', 'WILLIAMS']
+street_names = ['NW 7TH ST', 'SW 8TH ST', 'N MAIN ST', 'BISCAYNE BLVD', 'CORAL WAY', 'FLAGLER ST']
+cities = ['MIAMI', 'HIALEAH', 'DORAL', 'KENDALL', 'HOMESTEAD']
+phone_types = ['Mobile', 'Landline', 'VoIP']
+
+def random_addresses(rng, rows):
+    return pd.Series(rng.integers(1, 20000, rows).astype(str)) + ' ' + pd.Series(rng.choice(street_names, rows))
+
+def random_phones(rng, rows, fill_rate):
+    # Mix the formats seen in vendor files: plain numbers and formatted text
+    numbers = pd.Series(rng.integers(2002000000, 9899999999, rows))
+    formatted = '(' + (numbers // 10 ** 7).astype(str) + ') ' + (numbers // 10 ** 4 % 1000).astype(str).str.zfill(3) + '-' + (numbers % 10 ** 4).astype(str).str.zfill(4)
+    phones = numbers.astype(object).where(rng.random(rows) < 0.7, formatted)
+    return phones.where(rng.random(rows) < fill_rate)
+
+def synthetic_campaign_data(rows, seed=0, shared_addresses=None):
+    # Build a CRM export shaped like the "SMS"/"Cold Calling" files read by skiptrace.py
+    rng = np.random.default_rng(seed)
+    mailing_address = random_addresses(rng, rows)
+    mailing_zip = pd.Series(rng.integers(33010, 33199, rows))
+
+    # Reuse part of another campaign's addresses so the dedup step has overlaps to find
+    if shared_addresses is not None and len(shared_addresses):
+        shared = rng.random(rows) < 0.2
+        picks = shared_addresses.sample(int(shared.sum()), replace=True, random_state=seed)
+        mailing_address[shared] = picks['MAILING ADDRESS'].to_numpy()
+        mailing_zip[shared] = picks['MAILING ZIP'].to_numpy()
+
+    first = rng.choice(first_names, rows)
+    last = rng.choice(last_names, rows)
+    data = pd.DataFrame({
+        'FOLIO': rng.integers(10 ** 12, 10 ** 13, rows),
+        'OWNER FULL NAME': pd.Series(first) + ' ' + pd.Series(last),
+        'OWNER FIRST NAME': first,
+        'OWNER LAST NAME': last,
+        'ADDRESS': random_addresses(rng, rows),
+        'CITY': rng.choice(cities, rows),
+        'STATE': 'FL',
+        'ZIP': rng.integers(33010, 33199, rows),
+        'MAILING ADDRESS': mailing_address,
+        'MAILING CITY': rng.choice(cities, rows),
+        'MAILING STATE': 'FL',
+        'MAILING ZIP': mailing_zip,
+        'TAGS': pd.Series(rng.choice(['Skiptrace', 'Hot Lead', 'Probate'], rows)).where(rng.random(rows) < 0.4),
+    })
+    for i in range(1, 4):
+        data[f'PHONE NUMBER {i}'] = random_phones(rng, rows, 0.15)
+    return data
+
+def synthetic_t1_data(rows, seed=0):
+    # Build a T1Skiptrace BST_out file as returned by the vendor, with about half the phone cells empty
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({
+        'INPUT: First Name': rng.choice(first_names, rows),
+        'INPUT: Last Name': rng.choice(last_names, rows),
+        'INPUT: Address 1': random_addresses(rng, rows),
+        'INPUT: City': rng.choice(cities, rows),
+        'INPUT: State': 'FL',
+        'INPUT: Zip Code': rng.integers(33010, 33199, rows),
+        'INPUT: Extra 1': random_addresses(rng, rows),
+        'INPUT: Extra 2': rng.choice(cities, rows),
+        'INPUT: Extra 3': 'FL',
+        'INPUT: Extra 4': rng.integers(33010, 33199, rows),
+        'DEC: Deceased (Y/N)': rng.choice(['N', 'Y'], rows, p=[0.95, 0.05]),
+        'BNK: Bankrupt (Y/N)': rng.choice(['N', 'Y'], rows, p=[0.97, 0.03]),
+        'ADD: Address1': random_addresses(rng, rows),
+        'ADD: Address1 City': rng.choice(cities, rows),
+        'ADD: Address1 State': 'FL',
+        'ADD: Address1 Zip': rng.integers(33010, 33199, rows),
+    })
+    for i in range(1, 6):
+        data[f'PH: Phone{i}'] = random_phones(rng, rows, 0.6 / i)
+        data[f'PH: Phone{i} Type'] = pd.Series(rng.choice(phone_types, rows)).where(data[f'PH: Phone{i}'].notna())
+    for i in range(1, 6):
+        data[f'EMAIL: Email{i}'] = pd.Series([f"owner{n}@example.com" for n in rng.integers(0, 10 ** 6, rows)]).where(rng.random(rows) < 0.3 / i)
+    for col in phone_columns[5:]:
+        data[col] = random_phones(rng, rows, 0.2)
+    return data
+
+def synthetic_clean_data(t1_data, clean_rate=0.9, seed=0):
+    # Build an all_clean list holding most of the traced numbers plus some unrelated ones
+    rng = np.random.default_rng(seed)
+    numbers = t1_data[phone_columns].stack().reset_index(drop=True)
+    numbers = numbers[rng.random(len(numbers)) < clean_rate]
+    extra = pd.Series(rng.integers(2002000000, 9899999999, len(numbers)))
+    return pd.DataFrame({'Numbers': pd.concat([numbers, extra], ignore_index=True)})
+
+def write_synthetic_workspace(folder, rows, seed=0):
+    # Lay out the input folders of all three stages for a batch of the given size
+    input_folder = os.path.join(folder, "input")
+    t1_input_folder = os.path.join(folder, "t1 input")
+    for path in (input_folder, t1_input_folder):
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    cold_calling = synthetic_campaign_data(rows, seed)
+    sms = synthetic_campaign_data(rows, seed + 1, shared_addresses=cold_calling[['MAILING ADDRESS', 'MAILING ZIP']])
+    write_excel(cold_calling, os.path.join(input_folder, "Cold Calling.xlsx"))
+    write_excel(sms, os.path.join(input_folder, "SMS.xlsx"))
+
+    # The vendor echoes the owner and mailing address of the campaign file it was sent in its INPUT: columns
+    t1_data = synthetic_t1_data(rows, seed)
+    t1_data['INPUT: First Name'] = cold_calling['OWNER FIRST NAME']
+    t1_data['INPUT: Last Name'] = cold_calling['OWNER LAST NAME']
+    t1_data['INPUT: Address 1'] = cold_calling['MAILING ADDRESS']
+    t1_data['INPUT: Zip Code'] = cold_calling['MAILING ZIP']
+    write_excel(t1_data, os.path.join(t1_input_folder, "T1Skiptrace BST_out.xlsx"))
+    write_excel(cold_calling.rename(columns=desired_columns)[column_order], os.path.join(t1_input_folder, "Cold Calling - BST.xlsx"))
+    write_excel(synthetic_clean_data(t1_data, seed=seed), os.path.join(t1_input_folder, "all_clean.xlsx"))
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import http.client
+import urllib.error
+import urllib.request
+import pandas as pd
+
+from instrumentation import measure, run_report_from_env
+from xlsx_io import read_excel, write_excel
+
+VENDOR_URL = "http://127.0.0.1:8765"
+BATCH_SIZE = 1000
+# Longest wait for a submitted batch to be ready, in seconds
+MAX_WAIT = 3600
+
+# skiptrace.py output columns sent to the vendor, under the vendor's input field names
+vendor_input_columns = {
+    'OwnerFirstName': 'First Name', 'OwnerLastName': 'Last Name',
+    'MailingAddress': 'Address 1', 'MailingCity': 'City', 'MailingState': 'State', 'MailingZip': 'Zip Code',
+    'PropertyAddress': 'Extra 1', 'PropertyCity': 'Extra 2', 'PropertyState': 'Extra 3', 'PropertyZip': 'Extra 4',
+}
+
+class VendorError(Exception):
+    pass
+
+class RateLimiter:
+    # Spaces requests out so that at most `rate` of them start per second, across all batches
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_start = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def vendor_records(data):
+    # Plain JSON records, missing values as null
+    records = data[[column for column in vendor_input_columns if column in data.columns]].rename(columns=vendor_input_columns)
+    return json.loads(records.to_json(orient='records'))
+
+def split_batches(records, batch_size=BATCH_SIZE):
+    return [records[start:start + batch_size] for start in range(0, len(records), batch_size)]
+
+def http_json(method, url, payload=None, timeout=60):
+    # Blocking request returning (status, Retry-After, JSON body); run in a thread by the async client
+    data = None if payload is None else json.dumps(payload).encode()
+    request = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, None, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        retry_after = e.headers.get('Retry-After')
+        return e.code, float(retry_after) if retry_after else None, None
+
+async def request_json(method, url, limiter, payload=None, retries=5, backoff=0.5):
+    # Retry rate limited (429), server (5xx), connection errors and truncated or invalid JSON bodies with exponential backoff
+    for attempt in range(retries + 1):
+        await limiter.wait()
+        try:
+            status, retry_after, body = await asyncio.to_thread(http_json, method, url, payload)
+        except (urllib.error.URLError, OSError, http.client.HTTPException, json.JSONDecodeError) as e:
+            status, retry_after, body = None, None, str(e)
+        if status is not None and status < 400:
+            return body
+        if status is not None and status != 429 and status < 500:
+            raise VendorError(f"{method} {url} failed with status {status}")
+        if attempt == retries:
+            raise VendorError(f"{method} {url} failed after {retries + 1} attempts (last status: {status or body})")
+        await asyncio.sleep(retry_after or backoff * 2 ** attempt)
+
+async def trace_batch(records, vendor_url, limiter, semaphore, poll_interval=1.0, max_wait=MAX_WAIT):
+    # Submit one batch and poll until its results are ready, a batch stuck in processing fails after max_wait seconds
+    async with semaphore:
+        submitted = await request_json('POST', f"{vendor_url}/batches", limiter, {'records': records})
+        deadline = time.monotonic() + max_wait
+        while True:
+            if time.monotonic() > deadline:
+                raise VendorError(f"Batch {submitted['batch_id']} was not ready after {max_wait} seconds")
+            await asyncio.sleep(poll_interval)
+            result = await request_json('GET', f"{vendor_url}/batches/{submitted['batch_id']}", limiter)
+            if result['status'] == 'done':
+                return pd.DataFrame(result['rows'], columns=result['columns'])
+            if result['status'] == 'failed':
+                raise VendorError(f"Batch {submitted['batch_id']} failed at the vendor")
+
+async def trace_batches(batches, vendor_url=VENDOR_URL, concurrency=4, rate=10.0, poll_interval=1.0, max_wait=MAX_WAIT):
+    # Run the batches concurrently, keeping the results in batch order
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(trace_batch(batch, vendor_url, limiter, semaphore, poll_interval, max_wait) for batch in batches))
+
+def trace_campaign_data(data, vendor_url=VENDOR_URL, batch_size=BATCH_SIZE, concurrency=4, rate=10.0, poll_interval=1.0, max_wait=MAX_WAIT):
+    batches = split_batches(vendor_records(data), batch_size)
+    if not batches:
+        return pd.DataFrame()
+    results = asyncio.run(trace_batches(batches, vendor_url, concurrency, rate, poll_interval, max_wait))
+    return pd.concat(results, ignore_index=True)
+
+def t1_output_name(file_name):
+    # "Cold Calling - BST.xlsx" comes back as "Cold Calling - BST T1Skiptrace BST_out.xlsx"
+    return file_name.replace('.xlsx', ' T1Skiptrace BST_out.xlsx')
+
+def trace_skiptrace_output(output_folder="output", t1_input_folder="t1 input", vendor_url=VENDOR_URL, batch_size=BATCH_SIZE, concurrency=4, rate=10.0, poll_interval=1.0, max_wait=MAX_WAIT):
+    # Send every skiptrace.py output file to the vendor and place the results next to it in the T1 input folder
+    if not os.path.exists(t1_input_folder):
+        os.makedirs(t1_input_folder)
+
+    bst_files = [f for f in os.listdir(output_folder) if f.endswith(' - BST.xlsx')]
+    if not bst_files:
+        print("No '- BST' file found in the output folder.")
+        return
+
+    traced = {}
+    for file_name in bst_files:
+        bst_path = os.path.join(output_folder, file_name)
+        try:
+            with measure('trace_client', 'read', file_name) as values:
+                data = read_excel(bst_path)
+                values['rows'] = len(data)
+            with measure('trace_client', 'trace', file_name) as values:
+                t1_data = trace_campaign_data(data, vendor_url, batch_size, concurrency, rate, poll_interval, max_wait)
+                values['rows'] = len(t1_data)
+        except Exception as e:
+            print(f"Failed to trace {file_name}: {e}")
+            continue
+
+        # before_t1.py needs the campaign file too, to match the traces back to their Folios
+        t1_path = os.path.join(t1_input_folder, t1_output_name(file_name))
+        try:
+            shutil.copy2(bst_path, os.path.join(t1_input_folder, file_name))
+            with measure('trace_client', 'write', os.path.basename(t1_path)) as values:
+                values['rows'] = len(t1_data)
+                write_excel(t1_data, t1_path)
+            print(f"Traced {len(t1_data)} of {len(data)} records from {file_name}, saved at {t1_path}")
+            traced[file_name] = t1_data
+        except Exception as e:
+            print(f"Failed to save the traces of {file_name}: {e}")
+
+    return traced
+
+if __name__ == "__main__":
+    with run_report_from_env("t1 input"):
+        trace_skiptrace_output()
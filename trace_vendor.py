@@ -0,0 +1,180 @@
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the T1Skiptrace vendor: accepts batches of records and returns deterministic fake traces
+VENDOR_HOST = "127.0.0.1"
+VENDOR_PORT = 8765
+
+# Input fields echoed back in the INPUT: columns, in the vendor's order
+input_fields = ['First Name', 'Last Name', 'Address 1', 'City', 'State', 'Zip Code', 'Extra 1', 'Extra 2', 'Extra 3', 'Extra 4']
+
+result_columns = (
+    [f'INPUT: {field}' for field in input_fields]
+    + ['DEC: Deceased (Y/N)', 'BNK: Bankrupt (Y/N)', 'ADD: Address1', 'ADD: Address1 City', 'ADD: Address1 State', 'ADD: Address1 Zip']
+    + [column for i in range(1, 6) for column in (f'PH: Phone{i}', f'PH: Phone{i} Type')]
+    + [f'EMAIL: Email{i}' for i in range(1, 6)]
+    + [f'REL{i}: Phone {j}' for i in range(1, 4) for j in range(1, 4)]
+)
+
+phone_types = ['Mobile', 'Landline', 'VoIP']
+
+def fake_phone(rng):
+    # Mix the formats seen in vendor files: plain numbers and formatted text
+    number = rng.randint(2002000000, 9899999999)
+    if rng.random() < 0.7:
+        return number
+    return f"({number // 10 ** 7}) {number // 10 ** 4 % 1000:03d}-{number % 10 ** 4:04d}"
+
+def fake_trace(record):
+    # The same record always gets the same trace, whichever batch it comes in
+    seed = hashlib.sha1(json.dumps([record.get(field) for field in input_fields]).encode()).digest()
+    rng = random.Random(seed)
+
+    row = [record.get(field) for field in input_fields]
+    row += ['Y' if rng.random() < 0.05 else 'N', 'Y' if rng.random() < 0.03 else 'N']
+    row += [record.get('Address 1'), record.get('City'), record.get('State'), record.get('Zip Code')]
+    for i in range(1, 6):
+        phone = fake_phone(rng) if rng.random() < 0.6 / i else None
+        row += [phone, rng.choice(phone_types) if phone is not None else None]
+    row += [f"owner{rng.randint(0, 10 ** 6)}@example.com" if rng.random() < 0.3 / i else None for i in range(1, 6)]
+    row += [fake_phone(rng) if rng.random() < 0.2 else None for _ in range(9)]
+    return row
+
+class VendorState:
+    def __init__(self, delay=1.0, rate_limit=20, failure_rate=0.0, drop_rate=0.0, shuffle=False, seed=0):
+        self.delay = delay
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self.shuffle = shuffle
+        self.rng = random.Random(seed)
+        self.batches = {}
+        self.requests = deque()
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        # Sliding one-second window, like the vendor's per-key request limit
+        with self.lock:
+            now = time.monotonic()
+            while self.requests and now - self.requests[0] > 1.0:
+                self.requests.popleft()
+            if self.rate_limit and len(self.requests) >= self.rate_limit:
+                return False
+            self.requests.append(now)
+            return True
+
+    def fail_request(self):
+        with self.lock:
+            return self.rng.random() < self.failure_rate
+
+    def submit(self, records):
+        with self.lock:
+            batch_id = f"batch-{len(self.batches) + 1}"
+            self.batches[batch_id] = {'records': records, 'ready_at': time.monotonic() + self.delay, 'seed': self.rng.random()}
+        return batch_id
+
+    def results(self, batch_id):
+        batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        if time.monotonic() < batch['ready_at']:
+            return {'batch_id': batch_id, 'status': 'processing'}
+
+        # Like the real vendor, some records may be missing and the order isn't guaranteed
+        rng = random.Random(batch['seed'])
+        rows = [fake_trace(record) for record in batch['records'] if rng.random() >= self.drop_rate]
+        if self.shuffle:
+            rng.shuffle(rows)
+        return {'batch_id': batch_id, 'status': 'done', 'columns': result_columns, 'rows': rows}
+
+class VendorHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def check_limits(self):
+        if not self.state.allow_request():
+            self.send_json(429, {'error': "Too many requests"}, {'Retry-After': '1'})
+            return False
+        if self.state.fail_request():
+            self.send_json(503, {'error': "Service unavailable"})
+            return False
+        return True
+
+    def do_POST(self):
+        if self.path != '/batches':
+            return self.send_json(404, {'error': "Not found"})
+        if not self.check_limits():
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            records = payload['records']
+        except (ValueError, KeyError, TypeError):
+            return self.send_json(400, {'error': "Expected a JSON body with a 'records' list"})
+        batch_id = self.state.submit(records)
+        self.send_json(202, {'batch_id': batch_id, 'status': 'processing', 'records': len(records)})
+
+    def do_GET(self):
+        match = re.fullmatch(r'/batches/([\w-]+)', self.path)
+        if match is None:
+            return self.send_json(404, {'error': "Not found"})
+        if not self.check_limits():
+            return
+        results = self.state.results(match.group(1))
+        if results is None:
+            return self.send_json(404, {'error': f"No batch {match.group(1)}"})
+        self.send_json(200, results)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet, the client reports progress
+        pass
+
+def make_vendor_server(host=VENDOR_HOST, port=VENDOR_PORT, **state_kwargs):
+    handler = type('StandInVendorHandler', (VendorHandler,), {'state': VendorState(**state_kwargs)})
+    return ThreadingHTTPServer((host, port), handler)
+
+def start_vendor_server(host=VENDOR_HOST, port=0, **state_kwargs):
+    # Serve from a background thread, port 0 picks a free port; returns the server and its base URL
+    server = make_vendor_server(host, port, **state_kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the T1Skiptrace vendor.")
+    parser.add_argument('--host', default=VENDOR_HOST)
+    parser.add_argument('--port', type=int, default=VENDOR_PORT)
+    parser.add_argument('--delay', type=float, default=1.0, help="seconds before a batch is ready")
+    parser.add_argument('--rate-limit', type=int, default=20, help="requests per second before answering 429")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument('--drop-rate', type=float, default=0.0, help="share of records left out of the results")
+    parser.add_argument('--shuffle', action='store_true', help="return the records in a different order")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = make_vendor_server(args.host, args.port, delay=args.delay, rate_limit=args.rate_limit,
+                                failure_rate=args.failure_rate, drop_rate=args.drop_rate, shuffle=args.shuffle, seed=args.seed)
+    print(f"Stand-in vendor listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import hashlib
+import pandas as pd
+
+from schema import string_dtype
+from xlsx_io import read_excel
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Folder holding the columnar copies of the xlsx files and its disk budget
+CACHE_FOLDER = ".xlsx_cache"
+CACHE_BUDGET_BYTES = 2 * 1024 ** 3
+
+def file_digest(path, block_size=1024 * 1024):
+    # Hash the file contents in blocks so big workbooks don't need to fit in memory
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_key(path, read_kwargs):
+    # Key on content hash + mtime + size, and on the read options since they change the frame
+    stat = os.stat(path)
+    # Callables are keyed by name, their repr holds a memory address that changes between runs
+    options = repr(sorted(
+        (name, f"{value.__module__}.{value.__qualname__}" if callable(value) else value)
+        for name, value in read_kwargs.items()
+    ))
+    key = f"{file_digest(path)}|{stat.st_mtime_ns}|{stat.st_size}|{options}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def evict_cache(cache_folder=CACHE_FOLDER, budget_bytes=CACHE_BUDGET_BYTES):
+    # Remove the least recently used entries until the cache fits in the disk budget
+    entries = []
+    for f in os.listdir(cache_folder):
+        if f.endswith('.feather'):
+            entry_path = os.path.join(cache_folder, f)
+            # Another process may have evicted the entry in the meantime
+            try:
+                stat = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total_size <= budget_bytes:
+            break
+        try:
+            os.remove(entry_path)
+            total_size -= size
+        except OSError:
+            continue
+
+def cacheable(data):
+    # Arrow can't store object columns mixing numbers and text, e.g. phone cells typed as numbers and as
+    # "(305) 555-1234", so those become string columns, the same on a cache miss and on a hit
+    mixed = [col for col in data.columns
+             if data[col].dtype == object and pd.api.types.infer_dtype(data[col], skipna=True).startswith('mixed')]
+    if not mixed:
+        return data
+    strings = string_dtype()
+    return data.assign(**{col: data[col].map(lambda value: value if pd.isna(value) else str(value)).astype(strings) for col in mixed})
+
+def read_excel_cached(path, cache_folder=CACHE_FOLDER, budget_bytes=CACHE_BUDGET_BYTES, **read_kwargs):
+    # Without pyarrow there is nowhere to cache to, so fall back to a plain read
+    if feather is None or cache_folder is None:
+        return read_excel(path, **read_kwargs)
+
+    if not os.path.exists(cache_folder):
+        os.makedirs(cache_folder)
+
+    entry_path = os.path.join(cache_folder, f"{cache_key(path, read_kwargs)}.feather")
+
+    # Cache hit: memory-mapped column load, and touch the entry for LRU ordering
+    if os.path.exists(entry_path):
+        try:
+            data = feather.read_table(entry_path, memory_map=True).to_pandas()
+            os.utime(entry_path)
+            return data
+        except Exception as e:
+            print(f"Ignoring unreadable cache entry for {path}: {e}")
+
+    data = cacheable(read_excel(path, **read_kwargs))
+
+    # Cache miss: store the frame
+    temp_path = f"{entry_path}.{os.getpid()}.tmp"
+    try:
+        feather.write_feather(data.reset_index(drop=True), temp_path)
+        os.replace(temp_path, entry_path)
+        evict_cache(cache_folder, budget_bytes)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        print(f"Could not cache {path}: {e}")
+
+    return data
+
+def read_table_cached(path, **read_kwargs):
+    # CSV and Parquet files are read directly, xlsx files go through the cache
+    if path.endswith('.csv'):
+        return pd.read_csv(path, **read_kwargs)
+    if path.endswith('.parquet'):
+        columns = read_kwargs.pop('usecols', None)
+        return pd.read_parquet(path, columns=columns, **read_kwargs)
+    return read_excel_cached(path, **read_kwargs)
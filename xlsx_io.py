@@ -0,0 +1,187 @@
+import importlib.util
+import pandas as pd
+
+def module_available(module):
+    return importlib.util.find_spec(module) is not None
+
+def pandas_version():
+    return tuple(int(part) for part in pd.__version__.split('.')[:2])
+
+def read_engine():
+    # calamine parses xlsx in Rust and is much faster than openpyxl, pandas supports it from 2.2
+    if module_available('python_calamine') and pandas_version() >= (2, 2):
+        return 'calamine'
+    return 'openpyxl'
+
+def write_engine():
+    # xlsxwriter streams rows to disk in constant_memory mode, openpyxl keeps the whole sheet in memory
+    if module_available('xlsxwriter'):
+        return 'xlsxwriter'
+    return 'openpyxl'
+
+def read_excel(path, engine=None, **read_kwargs):
+    # Read with the fastest available engine, falling back to openpyxl if it can't handle the file
+    engine = engine or read_engine()
+    try:
+        return pd.read_excel(path, engine=engine, **read_kwargs)
+    except (ImportError, ValueError) as e:
+        if engine == 'openpyxl':
+            raise
+        print(f"The {engine} engine could not read {path}, falling back to openpyxl: {e}")
+        return pd.read_excel(path, engine='openpyxl', **read_kwargs)
+
+def excel_rows(data, chunk_size=10000):
+    # Yield the rows as plain Python values, with missing values as None so they are written as blank cells
+    for start in range(0, len(data), chunk_size):
+        chunk = data.iloc[start:start + chunk_size].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+def write_excel_xlsxwriter(data, path):
+    import xlsxwriter
+
+    # pandas writes cells column by column, which constant_memory mode doesn't allow, so rows are written here
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        'strings_to_urls': False,
+    })
+    try:
+        worksheet = workbook.add_worksheet('Sheet1')
+        worksheet.write_row(0, 0, [str(col) for col in data.columns])
+        for row_number, row in enumerate(excel_rows(data), start=1):
+            worksheet.write_row(row_number, 0, row)
+    finally:
+        workbook.close()
+
+def write_excel(data, path, engine=None):
+    # Write the frame without its index, like to_excel(path, index=False)
+    engine = engine or write_engine()
+    if engine == 'xlsxwriter':
+        write_excel_xlsxwriter(data, path)
+    else:
+        data.to_excel(path, index=False, engine=engine)
+
+def write_table(data, path):
+    # Write CSV or Parquet when the extension asks for it, xlsx otherwise
+    if path.endswith('.csv'):
+        data.to_csv(path, index=False)
+    elif path.endswith('.parquet'):
+        data.to_parquet(path, index=False)
+    else:
+        write_excel(data, path)
+
+def iter_excel_chunks(path, chunk_size=50000):
+    import openpyxl
+
+    # Stream the first sheet with openpyxl's read-only mode so only one chunk of rows is held at a time
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        chunks = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield pd.DataFrame(batch, columns=header)
+                chunks += 1
+                batch = []
+        # A header-only sheet still yields one empty chunk, so writers get its columns
+        if batch or not chunks:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+class CsvChunkWriter:
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = columns
+        self.header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        # Nothing written, still create the file with its header so readers find the columns
+        if self.header and self.columns is not None:
+            self.write(pd.DataFrame(columns=self.columns))
+
+class ParquetChunkWriter:
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = columns
+        self.writer = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Every chunk is stored as a row group with the schema of the first chunk
+        if self.writer is None:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = pa.Table.from_pandas(chunk, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        # Nothing written, still create an empty table with the columns
+        if self.writer is None and self.columns is not None:
+            self.write(pd.DataFrame(columns=self.columns))
+        if self.writer is not None:
+            self.writer.close()
+
+class XlsxChunkWriter:
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = columns
+        self.row_number = 0
+        self.engine = write_engine()
+        if self.engine == 'xlsxwriter':
+            import xlsxwriter
+
+            self.workbook = xlsxwriter.Workbook(path, {
+                'constant_memory': True,
+                'default_date_format': 'yyyy-mm-dd',
+                'strings_to_urls': False,
+            })
+            self.worksheet = self.workbook.add_worksheet('Sheet1')
+        else:
+            import openpyxl
+
+            self.workbook = openpyxl.Workbook(write_only=True)
+            self.worksheet = self.workbook.create_sheet('Sheet1')
+
+    def append(self, row):
+        if self.engine == 'xlsxwriter':
+            self.worksheet.write_row(self.row_number, 0, row)
+        else:
+            self.worksheet.append(row)
+        self.row_number += 1
+
+    def write(self, chunk):
+        if self.row_number == 0:
+            self.append([str(col) for col in chunk.columns])
+        for row in excel_rows(chunk):
+            self.append(row)
+
+    def close(self):
+        # Nothing written, still save the header row so readers find the columns
+        if self.row_number == 0 and self.columns is not None:
+            self.append([str(col) for col in self.columns])
+        if self.engine == 'xlsxwriter':
+            self.workbook.close()
+        else:
+            self.workbook.save(self.path)
+
+def open_chunk_writer(path, columns=None):
+    # Pick the incremental writer from the file extension, columns are written as an empty table when no chunk comes
+    if path.endswith('.csv'):
+        return CsvChunkWriter(path, columns)
+    if path.endswith('.parquet'):
+        return ParquetChunkWriter(path, columns)
+    return XlsxChunkWriter(path, columns)